@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Times the three stages of compiling `Mako`_ templates -- lexing,
+  generating the module source and compiling that to Python bytecode --
+  across a corpus of templates of increasing size::
+  
+      python bench/compile_templates.py [--repeat N] [template files...]
+  
+  With no files given, a synthetic corpus is generated, with templates of
+  roughly 50, 500, 2,000 and 5,000 lines mixing text, expressions, control
+  lines, comments, defs, calls and python blocks.
+  
+  .. _`Mako`: http://www.makotemplates.org/
+"""
+
+import optparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mako import codegen
+from mako.lexer import Lexer
+
+CHUNK = u"""## section @N@
+<%def name="row_@N@(item, cls='odd')">
+    <tr class="${cls}">
+        <td>${item['id']}</td>
+        <td>${item['name'] | h}</td>
+        <td>${item.get('price', 0) * 2}</td>
+    </tr>
+</%def>
+<div id="section-@N@" class="section">
+    <h2>Section @N@ &mdash; ${title | h}</h2>
+    <%doc>
+        Rows for section @N@.
+    </%doc>
+    <table>
+% for i, item in enumerate(items):
+    % if i % 2:
+        ${row_@N@(item)}
+    % else:
+        ${row_@N@(item, cls='even')}
+    % endif
+% endfor
+    </table>
+    <%
+        total = sum([x.get('price', 0) for x in items])
+        label = "total: %s" % total
+    %>
+    <p class="total">${label}</p>
+    <%call expr="row_@N@({'id': 0, 'name': 'footer'})">
+        ignored ${caller_body_@N@}
+    </%call>
+    <p>Some static text which carries on for a while, describing things
+    in enough detail that the lexer has to work through a long run of
+    plain characters before it gets to the next ${'expression'}.</p>
+</div>
+"""
+
+def make_template(lines):
+    """ Return a template of at least ``lines`` lines.
+    """
+    
+    chunk_lines = CHUNK.count(u'\n')
+    parts = [u'<%page args="title, items"/>\n']
+    for n in range(max(1, lines // chunk_lines)):
+        parts.append(CHUNK.replace(u'@N@', unicode(n)))
+    return u''.join(parts)
+    
+
+def best_of(repeat, fn, *args):
+    """ Return ``(seconds, result)`` for the fastest of ``repeat`` calls.
+    """
+    
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        result = fn(*args)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+    
+
+def lex(text, name):
+    return Lexer(text, name).parse()
+    
+
+def generate(node, name):
+    return codegen.compile(node, name, name, default_filters=['unicode'])
+    
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] [templates...]')
+    parser.add_option('--repeat', type='int', default=5)
+    options, args = parser.parse_args()
+    
+    if args:
+        corpus = [(path, open(path, 'rb').read().decode('utf-8')) 
+                  for path in args]
+    else:
+        corpus = [('synthetic-%d' % n, make_template(n)) 
+                  for n in (50, 500, 2000, 5000)]
+    
+    print '%-24s %7s %10s %10s %10s' % (
+        'template', 'lines', 'lex ms', 'codegen ms', 'compile ms'
+    )
+    for name, text in corpus:
+        lex_t, node = best_of(options.repeat, lex, text, name)
+        gen_t, source = best_of(options.repeat, generate, node, name)
+        compile_t, code = best_of(options.repeat, compile, source, name, 'exec')
+        print '%-24s %7d %10.1f %10.1f %10.1f' % (
+            name[-24:], text.count(u'\n'), 
+            lex_t * 1000, gen_t * 1000, compile_t * 1000
+        )
+    
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Times rendering `Mako`_ templates, along with the number of
+  ``__M_writer()`` calls in the module generated for each, so that
+  changes to the generated code (such as coalescing adjacent text
+  writes) can be measured by running it before and after::
+
+      python bench/render_templates.py [--repeat N] [--number N]
+
+  The suite covers a comment-heavy loop, where most adjacent text writes
+  come from, an escape-heavy listing and a page inheriting from a layout.
+
+  .. _`Mako`: http://www.makotemplates.org/
+"""
+
+import optparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mako.lookup import TemplateLookup
+
+COMMENTS = u"""<%page args="rows"/>
+<table>
+% for row in rows:
+    ## a comment between two runs of text
+    <tr>
+    ## and another
+        <td>
+        <%doc>
+            A doc block, which generates nothing.
+        </%doc>
+            ${row}
+        </td>
+    ## and a third
+    </tr>
+% endfor
+</table>
+"""
+
+LISTING = u"""<%page args="rows"/>
+<ul>
+% for row in rows:
+    <li class="${'odd' if row % 2 else 'even'}">
+        <a href="/items/${row}">${u'<item %d & co>' % row | h}</a>
+    </li>
+% endfor
+</ul>
+"""
+
+LAYOUT = u"""<html>
+<head><title>${self.title()}</title></head>
+<body>
+    <div id="header">Header</div>
+    ${next.body(**context.kwargs)}
+    <div id="footer">Footer</div>
+</body>
+</html>
+<%def name="title()">Untitled</%def>
+"""
+
+PAGE = u"""<%inherit file="/layout.mako"/>
+<%page args="rows"/>
+<%def name="title()">Page of ${len(rows)} rows</%def>
+% for row in rows:
+    <p>Row ${row}: ${u'<b>%d</b>' % row | h}</p>
+% endfor
+"""
+
+SUITE = [
+    ('comments', '/comments.mako'),
+    ('listing', '/listing.mako'),
+    ('inheritance', '/page.mako'),
+]
+
+def make_lookup():
+    """ Return a ``TemplateLookup`` holding the templates in the suite.
+    """
+
+    lookup = TemplateLookup()
+    lookup.put_string('/comments.mako', COMMENTS)
+    lookup.put_string('/listing.mako', LISTING)
+    lookup.put_string('/layout.mako', LAYOUT)
+    lookup.put_string('/page.mako', PAGE)
+    return lookup
+
+
+def best_of(repeat, number, fn, *args, **kwargs):
+    """ Return the fastest, of ``repeat`` runs, average seconds taken by
+      ``number`` calls of ``fn(*args, **kwargs)``.
+    """
+
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        for j in xrange(number):
+            fn(*args, **kwargs)
+        elapsed = (time.time() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('--repeat', type='int', default=5)
+    parser.add_option('--number', type='int', default=200)
+    parser.add_option('--rows', type='int', default=200)
+    options, args = parser.parse_args()
+
+    lookup = make_lookup()
+    rows = range(options.rows)
+
+    print '%-16s %8s %12s' % ('template', 'writes', 'render us')
+    for name, uri in SUITE:
+        template = lookup.get_template(uri)
+        writes = template.code.count('__M_writer(')
+        render_t = best_of(
+            options.repeat, options.number, template.render, rows=rows
+        )
+        print '%-16s %8d %12.1f' % (name, writes, render_t * 1000000)
+
+
+if __name__ == '__main__':
+    main()
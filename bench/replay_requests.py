@@ -0,0 +1,447 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Replays a corpus of recorded HTTP requests against a `WSGI`_ application
+  in-process, so that an application can be benchmarked without a server
+  or the network in the loop::
+
+      python bench/replay_requests.py [options] [corpus files...]
+
+  Each corpus file holds one or more raw requests, in the form written by
+  ``str(request)``, separated by blank lines.  They're parsed with
+  ``webob.Request.from_file``.  The application is given as
+  ``--app module:attribute``, which is either a WSGI application, such as a
+  :py:class:`~weblayer.wsgi.WSGIApplication`, or a callable which returns
+  one.  With no application and no corpus, a small ``WSGIApplication`` and
+  a synthetic corpus for it are used.
+
+  Each of ``--concurrency`` workers replays the corpus ``--repeat`` times.
+  Workers are threads, or processes with ``--processes``.  The report
+  covers throughput, latency percentiles, allocations per request and a
+  breakdown by route.  Routes are named after the handler class when the
+  application is a ``WSGIApplication``, and after the method and path
+  otherwise.  Allocations are measured in a separate, single threaded
+  pass.  If ``tracemalloc`` is available they're counted in bytes;
+  otherwise they're the net number of objects which the garbage
+  collector tracks.
+
+  ``--output`` saves the results as JSON, and ``--compare`` reports the
+  change from results saved earlier, e.g. with a previous version::
+
+      python bench/replay_requests.py --app myapp:application \\
+          --output before.json traffic/*.http
+      python bench/replay_requests.py --app myapp:application \\
+          --compare before.json traffic/*.http
+
+  .. _`WSGI`: http://www.python.org/dev/peps/pep-0333/
+"""
+
+import gc
+import json
+import optparse
+import os
+import platform
+import sys
+import threading
+import time
+
+from cStringIO import StringIO
+from timeit import default_timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webob import Request
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+PERCENTILES = (50, 90, 95, 99)
+
+def read_requests(fp):
+    """ Return a list of the requests in the file ``fp``, skipping the blank
+      lines between them.
+    """
+
+    requests = []
+    while True:
+        pos = fp.tell()
+        line = fp.readline()
+        if not line:
+            break
+        if line.strip():
+            fp.seek(pos)
+            requests.append(Request.from_file(fp))
+    return requests
+
+
+def load_corpus(paths):
+    requests = []
+    for path in paths:
+        requests.extend(read_requests(StringIO(open(path, 'rb').read())))
+    return requests
+
+
+def load_app(spec):
+    """ Import the application named by ``module:attribute``, calling it
+      first if it's a function which takes no arguments.
+    """
+
+    module_name, attr = spec.split(':', 1)
+    __import__(module_name)
+    app = getattr(sys.modules[module_name], attr)
+    code = getattr(app, 'func_code', None)
+    if code is not None and code.co_argcount == 0:
+        # A factory
+        app = app()
+    return app
+
+
+def demo_app():
+    """ Return a small ``WSGIApplication`` and a synthetic corpus for it.
+    """
+
+    from weblayer import Bootstrapper, RequestHandler, WSGIApplication
+
+    class Hello(RequestHandler):
+        def get(self, name):
+            return u'hello %s' % self.request.params.get('greeting', name)
+
+
+    class Echo(RequestHandler):
+        __all__ = ('get', 'post')
+        def post(self):
+            return {'value': self.request.params.get('value')}
+
+
+    bootstrapper = Bootstrapper(
+        settings={
+            'cookie_secret': 'replay' * 8,
+            'static_files_path': os.getcwd(),
+            'template_directories': [os.getcwd()],
+            'check_xsrf': False
+        },
+        url_mapping=[(r'/hello/(\w+)', Hello), (r'/echo', Echo)]
+    )
+    app = WSGIApplication(*bootstrapper())
+
+    corpus = [
+        Request.blank('/hello/world'),
+        Request.blank('/hello/world?greeting=hi', headers={
+            'Accept': 'text/html,application/xhtml+xml,*/*;q=0.8',
+            'Cookie': 'a=1; b=2'
+        }),
+        Request.blank('/echo', POST={'value': 'x' * 100}),
+        Request.blank('/missing'),
+    ]
+    raw = '\n\n'.join([str(req) for req in corpus * 5])
+    return app, read_requests(StringIO(raw))
+
+
+def route_namer(app):
+    """ Return a function which names the route a request is for.
+    """
+
+    router = getattr(app, '_path_router', None)
+    def name(req):
+        if router is not None:
+            handler_class = router.match(req.path)[0]
+            if handler_class is not None:
+                return handler_class.__name__
+            return '(no route)'
+        return '%s %s' % (req.method, req.path)
+    return name
+
+
+def replay(app, requests, repeat, samples):
+    """ Call ``app`` with each of ``requests`` in turn, ``repeat`` times,
+      appending ``(index, status, seconds)`` to ``samples``.
+
+      Each request is copied before it's timed, so every call starts with
+      a fresh environ and body.
+    """
+
+    for i in xrange(repeat):
+        for index, req in enumerate(requests):
+            req = req.copy()
+            start = default_timer()
+            status, headers, app_iter = req.call_application(app)
+            try:
+                for chunk in app_iter:
+                    pass
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+            samples.append((index, status[:3], default_timer() - start))
+
+
+def run_threads(app, requests, repeat, concurrency):
+    """ Replay with ``concurrency`` threads, returning ``(samples, wall)``.
+    """
+
+    results = [[] for i in range(concurrency)]
+    go = threading.Event()
+    def worker(samples):
+        go.wait()
+        replay(app, requests, repeat, samples)
+    threads = [threading.Thread(target=worker, args=(samples,))
+               for samples in results]
+    for thread in threads:
+        thread.start()
+    start = default_timer()
+    go.set()
+    for thread in threads:
+        thread.join()
+    wall = default_timer() - start
+    return [sample for samples in results for sample in samples], wall
+
+
+def _process_worker(app, requests, repeat, go, queue):
+    samples = []
+    go.wait()
+    replay(app, requests, repeat, samples)
+    queue.put(samples)
+
+
+def run_processes(app, requests, repeat, concurrency):
+    """ Replay with ``concurrency`` processes, returning ``(samples, wall)``.
+
+      The processes are forked, so the application and requests don't
+      need to be picklable.
+    """
+
+    import multiprocessing
+    go = multiprocessing.Event()
+    queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_process_worker,
+                                         args=(app, requests, repeat, go, queue))
+                 for i in range(concurrency)]
+    for process in processes:
+        process.start()
+    start = default_timer()
+    go.set()
+    samples = []
+    for process in processes:
+        samples.extend(queue.get())
+    wall = default_timer() - start
+    for process in processes:
+        process.join()
+    return samples, wall
+
+
+def measure_allocations(app, requests):
+    """ Return ``(unit, [allocations per request])`` for one call with each
+      of ``requests``.
+    """
+
+    allocations = []
+    for req in requests:
+        req = req.copy()
+        if tracemalloc is not None:
+            tracemalloc.start()
+            replay(app, [req], 1, [])
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            allocations.append(peak)
+        else:
+            gc.collect()
+            gc.disable()
+            try:
+                before = gc.get_count()[0]
+                replay(app, [req], 1, [])
+                allocations.append(gc.get_count()[0] - before)
+            finally:
+                gc.enable()
+    if tracemalloc is not None:
+        return 'peak bytes', allocations
+    return 'gc objects', allocations
+
+
+def percentile(ordered, p):
+    """ Return the ``p``th percentile of the sorted list ``ordered``, by
+      nearest rank.
+    """
+
+    if not ordered:
+        return None
+    rank = max(1, int(round(p / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def latency_stats(seconds):
+    ordered = sorted(seconds)
+    stats = {
+        'mean': sum(ordered) / len(ordered) * 1000,
+        'max': ordered[-1] * 1000
+    }
+    for p in PERCENTILES:
+        stats['p%d' % p] = percentile(ordered, p) * 1000
+    return stats
+
+
+def count(values):
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    return counts
+
+
+def summarise(samples, wall, routes, allocation_unit, allocations):
+    """ Return the results of a run as a dictionary, which is saved as JSON.
+      Latencies are in milliseconds.
+    """
+
+    by_route = {}
+    for index, status, seconds in samples:
+        by_route.setdefault(routes[index], []).append((status, seconds))
+    route_allocations = {}
+    for index, allocated in enumerate(allocations):
+        route_allocations.setdefault(routes[index], []).append(allocated)
+
+    results = {
+        'requests': len(samples),
+        'seconds': wall,
+        'throughput': len(samples) / wall,
+        'latency_ms': latency_stats([s for i, st, s in samples]),
+        'statuses': count([st for i, st, s in samples]),
+        'allocations': {
+            'unit': allocation_unit,
+            'per_request': float(sum(allocations)) / len(allocations)
+        },
+        'routes': {}
+    }
+    for route, route_samples in by_route.items():
+        allocated = route_allocations[route]
+        results['routes'][route] = {
+            'requests': len(route_samples),
+            'latency_ms': latency_stats([s for st, s in route_samples]),
+            'statuses': count([st for st, s in route_samples]),
+            'allocations': float(sum(allocated)) / len(allocated)
+        }
+    return results
+
+
+def report(results):
+    print '%d requests in %.2fs: %.1f requests/s' % (
+        results['requests'], results['seconds'], results['throughput']
+    )
+    print 'allocations per request: %.0f %s' % (
+        results['allocations']['per_request'], results['allocations']['unit']
+    )
+    print
+    print '%-24s %8s %8s %8s %8s %8s %8s %12s' % (
+        'route', 'requests', 'mean ms', 'p50 ms', 'p90 ms', 'p99 ms',
+        'max ms', 'allocations'
+    )
+    rows = sorted(results['routes'].items())
+    rows.append(('(all)', dict(results,
+        allocations=results['allocations']['per_request'])))
+    for route, stats in rows:
+        latency = stats['latency_ms']
+        print '%-24s %8d %8.3f %8.3f %8.3f %8.3f %8.3f %12.0f' % (
+            route[-24:], stats['requests'], latency['mean'], latency['p50'],
+            latency['p90'], latency['p99'], latency['max'],
+            stats['allocations']
+        )
+
+
+def compare(before, after):
+    """ Print the change from the results ``before`` to those ``after``.
+    """
+
+    def change(old, new):
+        if not old:
+            return '%12s' % '-'
+        return '%+11.1f%%' % ((new - old) * 100.0 / old)
+
+    print
+    print 'change from %s (%s):' % (
+        before['meta']['time'], before['meta'].get('label') or 'no label'
+    )
+    print '%-24s %12s %12s %12s %12s' % (
+        'route', 'throughput', 'p50', 'p99', 'allocations'
+    )
+    print '%-24s %s %12s %12s %s' % (
+        '(all)', change(before['throughput'], after['throughput']),
+        change(before['latency_ms']['p50'], after['latency_ms']['p50']),
+        change(before['latency_ms']['p99'], after['latency_ms']['p99']),
+        change(before['allocations']['per_request'],
+               after['allocations']['per_request'])
+    )
+    for route, stats in sorted(after['routes'].items()):
+        old = before['routes'].get(route)
+        if old is None:
+            continue
+        print '%-24s %12s %s %s %s' % (
+            route[-24:], '',
+            change(old['latency_ms']['p50'], stats['latency_ms']['p50']),
+            change(old['latency_ms']['p99'], stats['latency_ms']['p99']),
+            change(old['allocations'], stats['allocations'])
+        )
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] [corpus files...]')
+    parser.add_option('--app', help='the application, as module:attribute')
+    parser.add_option('--concurrency', type='int', default=1)
+    parser.add_option('--processes', action='store_true', default=False,
+                      help='run workers in processes rather than threads')
+    parser.add_option('--repeat', type='int', default=100,
+                      help='times each worker replays the corpus')
+    parser.add_option('--warmup', type='int', default=1,
+                      help='times the corpus is replayed before timing')
+    parser.add_option('--output', help='save the results as JSON')
+    parser.add_option('--compare', help='JSON results to compare with')
+    parser.add_option('--label', help='a label saved with the results')
+    options, args = parser.parse_args()
+
+    if options.app:
+        if not args:
+            parser.error('give the corpus files to replay')
+        app = load_app(options.app)
+        requests = load_corpus(args)
+    elif args:
+        parser.error('give the application to replay the corpus with --app')
+    else:
+        app, requests = demo_app()
+    if not requests:
+        parser.error('the corpus is empty')
+
+    name = route_namer(app)
+    routes = [name(req.copy()) for req in requests]
+
+    replay(app, requests, options.warmup, [])
+    allocation_unit, allocations = measure_allocations(app, requests)
+    if options.processes:
+        run = run_processes
+    else:
+        run = run_threads
+    samples, wall = run(app, requests, options.repeat, options.concurrency)
+
+    results = summarise(samples, wall, routes, allocation_unit, allocations)
+    results['meta'] = {
+        'label': options.label,
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'app': options.app or '(demo)',
+        'corpus': args or '(synthetic)',
+        'corpus_requests': len(requests),
+        'concurrency': options.concurrency,
+        'workers': options.processes and 'processes' or 'threads',
+        'repeat': options.repeat
+    }
+    report(results)
+    if options.compare:
+        compare(json.load(open(options.compare)), results)
+    if options.output:
+        out = open(options.output, 'w')
+        try:
+            json.dump(results, out, indent=2, sort_keys=True)
+        finally:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
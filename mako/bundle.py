@@ -0,0 +1,241 @@
+# bundle.py
+# Copyright (C) 2006, 2007, 2008, 2009, 2010 Michael Bayer
+# mike_mp@zzzcomputing.com
+#
+# This module is part of Mako and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+"""Provides packing of the templates of a :class:`.TemplateLookup` into
+a single file of precompiled modules, and the :class:`.BundleLookup`
+which serves templates from it."""
+
+import imp, marshal, os, posixpath, re, types, zipfile
+from mako import codegen, exceptions, util
+from mako.lookup import TemplateCollection
+from mako.template import ModuleTemplate
+
+try:
+    import threading
+except:
+    import dummy_threading as threading
+
+_INDEX = '__index__'
+
+# Template arguments which take effect when the template is
+# rendered, as opposed to those which are compiled into the module.
+_RUNTIME_ARGS = ('output_encoding', 'encoding_errors', 'disable_unicode',
+                'format_exceptions', 'error_handler', 'cache_type',
+                'cache_dir', 'cache_url', 'cache_enabled',
+                'template_globals')
+
+def write_bundle(lookup, path, predicate=None):
+    """Compile every template found in the directories of the given
+    :class:`.TemplateLookup` and write them to a bundle at ``path``.
+
+    Each template is stored as its marshalled code object, alongside
+    the generated module source and the template source, which are
+    used when reporting errors.  The bundle is an uncompressed zip
+    file, so that members can be read straight from the page cache.
+
+    :param predicate: optional callable which is passed the uri of
+     each file found, and returns ``False`` for those which are not
+     templates.
+
+    """
+
+    uris = []
+    for dir in lookup.directories:
+        for root, dirs, files in os.walk(dir):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in files:
+                if name.startswith('.'):
+                    continue
+                filename = os.path.join(root, name)
+                uri = '/' + os.path.relpath(filename, dir).\
+                                    replace(os.path.sep, '/')
+                if uri in uris or (predicate and not predicate(uri)):
+                    continue
+                uris.append(uri)
+
+    index = {}
+    tmp = path + '.tmp'
+    zf = zipfile.ZipFile(tmp, 'w', zipfile.ZIP_STORED)
+    try:
+        for uri in sorted(uris):
+            template = lookup.get_template(uri)
+            module_source = template.code
+            code = compile(module_source, template.module_id, 'exec')
+            if isinstance(module_source, unicode):
+                module_source = module_source.encode('utf-8')
+            template_source = open(template.filename, 'rb').read()
+            zf.writestr('code' + uri, marshal.dumps(code))
+            zf.writestr('module' + uri, module_source)
+            zf.writestr('source' + uri, template_source)
+            index[uri] = (template.module_id, template.filename)
+        zf.writestr(_INDEX, marshal.dumps({
+            'python':imp.get_magic(),
+            'magic_number':codegen.MAGIC_NUMBER,
+            'templates':index
+        }))
+    finally:
+        zf.close()
+    os.rename(tmp, path)
+    return sorted(index)
+
+class _Bundle(object):
+    """An open bundle file, and the modules loaded from it.
+
+    Bundles are shared by every :class:`.BundleLookup` created for
+    the same path, so that constructing a lookup doesn't reopen
+    the file or reload its modules."""
+
+    _bundles = {}
+    _bundles_mutex = threading.Lock()
+
+    @classmethod
+    def open(cls, path):
+        path = os.path.abspath(path)
+        cls._bundles_mutex.acquire()
+        try:
+            try:
+                return cls._bundles[path]
+            except KeyError:
+                bundle = cls._bundles[path] = cls(path)
+                return bundle
+        finally:
+            cls._bundles_mutex.release()
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path)
+        index = marshal.loads(self.zip.read(_INDEX))
+        if index['python'] != imp.get_magic() or \
+                index['magic_number'] != codegen.MAGIC_NUMBER:
+            raise exceptions.RuntimeException(
+                        "Template bundle %r was built by a different "
+                        "version of Python or Mako, and must be rebuilt" %
+                        path)
+        self.templates = index['templates']
+        self.modules = {}
+        self._mutex = threading.Lock()
+
+    def load(self, uri):
+        """Return a tuple of (module, module source, template source)
+        for the given uri."""
+
+        try:
+            return self.modules[uri]
+        except KeyError:
+            pass
+        self._mutex.acquire()
+        try:
+            try:
+                return self.modules[uri]
+            except KeyError:
+                pass
+            module_id, filename = self.templates[uri]
+            if not util.py3k and isinstance(module_id, unicode):
+                module_id = module_id.encode()
+            code = marshal.loads(self.zip.read('code' + uri))
+            module = types.ModuleType(module_id)
+            exec code in module.__dict__, module.__dict__
+            loaded = self.modules[uri] = (
+                module,
+                self.zip.read('module' + uri),
+                self.zip.read('source' + uri)
+            )
+            return loaded
+        finally:
+            self._mutex.release()
+
+class BundleLookup(TemplateCollection):
+    """Represent a collection of templates served from a bundle
+    written by :func:`.write_bundle`, without any filesystem access
+    per template.
+
+        from mako.bundle import write_bundle, BundleLookup
+
+        # at build time
+        write_bundle(TemplateLookup(["/path/to/templates"]),
+                        "/path/to/templates.bundle")
+
+        # at runtime
+        lookup = BundleLookup("/path/to/templates.bundle",
+                                output_encoding='utf-8')
+
+    Arguments which affect how templates are compiled, such as
+    ``default_filters`` or ``preprocessor``, are fixed when the
+    bundle is written and are ignored here, so that a
+    :class:`.BundleLookup` accepts the same keyword arguments as a
+    :class:`.TemplateLookup`.  Those which take effect at render
+    time, such as ``output_encoding``, are passed on to each
+    :class:`.ModuleTemplate`.
+
+    """
+
+    def __init__(self, bundle, **kwargs):
+        self.bundle = _Bundle.open(bundle)
+        self.template_args = dict(
+                    [(k, kwargs[k]) for k in _RUNTIME_ARGS if k in kwargs])
+        self._collection = {}
+        self._adjusted_uris = {}
+        self._mutex = threading.Lock()
+
+    def get_template(self, uri):
+        """Return a :class:`.Template` object corresponding to the given
+        URL.
+
+        """
+
+        try:
+            return self._collection[uri]
+        except KeyError:
+            key = '/' + re.sub(r'^\/+', '', uri)
+            if key not in self.bundle.templates:
+                raise exceptions.TopLevelLookupException(
+                                    "Cant locate template for uri %r" % uri)
+
+        module, module_source, template_source = self.bundle.load(key)
+        self._mutex.acquire()
+        try:
+            try:
+                return self._collection[uri]
+            except KeyError:
+                template = self._collection[uri] = ModuleTemplate(
+                                module,
+                                template_filename=self.bundle.templates[key][1],
+                                module_source=module_source,
+                                template_source=template_source,
+                                lookup=self,
+                                **self.template_args)
+                return template
+        finally:
+            self._mutex.release()
+
+    def adjust_uri(self, uri, relativeto):
+        """adjust the given uri based on the given relative uri."""
+
+        key = (uri, relativeto)
+        try:
+            return self._adjusted_uris[key]
+        except KeyError:
+            pass
+        if uri[0] != '/':
+            if relativeto is not None:
+                v = posixpath.join(posixpath.dirname(relativeto), uri)
+            else:
+                v = '/' + uri
+        else:
+            v = uri
+        self._adjusted_uris[key] = v
+        return v
+
+    def filename_to_uri(self, filename):
+        """Convert the given filename to a uri relative to
+           this TemplateCollection."""
+
+        for uri, (module_id, template_filename) in \
+                                self.bundle.templates.iteritems():
+            if template_filename == filename:
+                return uri
+        return None
@@ -11,7 +11,7 @@ import re
 from mako.pygen import PythonPrinter
 from mako import util, ast, parsetree, filters
 
-MAGIC_NUMBER = 5
+MAGIC_NUMBER = 10
 
 def compile(node, 
                 uri, 
@@ -120,6 +120,7 @@ class _GenerateRenderMethod(object):
         if defs is not None:
             for node in defs:
                 _GenerateRenderMethod(printer, compiler, node)
+            self.write_filter_chains()
     
     @property
     def identifiers(self):
@@ -136,6 +137,7 @@ class _GenerateRenderMethod(object):
         encoding =[None]
 
         self.compiler.pagetag = None
+        self.compiler.filter_chains = {}
         
         class FindTopLevel(object):
             def visitInheritTag(s, node):
@@ -180,6 +182,12 @@ class _GenerateRenderMethod(object):
                     "_template_cache=cache.Cache(__name__, _modified_time)")
         self.printer.writeline(
                     "_source_encoding=%r" % self.compiler.source_encoding)
+        if self.compiler.pagetag is not None:
+            cached_output = eval(self.compiler.pagetag.attributes.get(
+                                            'cached_output', 'False'))
+        else:
+            cached_output = False
+        self.printer.writeline("_cached_output=%r" % bool(cached_output))
         if self.compiler.imports:
             buf = ''
             for imp in self.compiler.imports:
@@ -253,7 +261,7 @@ class _GenerateRenderMethod(object):
 
         self.write_variable_declares(self.identifiers, toplevel=True)
 
-        for n in self.node.nodes:
+        for n in self.coalesce_text(self.node.nodes):
             n.accept_visitor(self)
 
         self.write_def_finish(self.node, buffered, filtered, cached)
@@ -284,23 +292,39 @@ class _GenerateRenderMethod(object):
             )
 
     def write_namespaces(self, namespaces):
-        """write the module-level namespace-generating callable."""
+        """write the module-level namespace-generating callables.
+        
+        each namespace is generated the first time it is requested
+        via _mako_get_namespace(); only those which are inheritable,
+        and therefore have to be present on the 'self' namespace, are
+        generated up front by _mako_generate_namespaces()."""
         self.printer.writelines(
             "def _mako_get_namespace(context, name):",
                 "try:",
                     "return context.namespaces[(__name__, name)]",
                 "except KeyError:",
-                    "_mako_generate_namespaces(context)",
+                    "_mako_generate_namespace(context, name)",
                 "return context.namespaces[(__name__, name)]",
             None,None
             )
         self.printer.writeline("def _mako_generate_namespaces(context):")
-
+        inheritable = [
+                    node.name for node in namespaces.values() 
+                    if eval(node.attributes.get('inheritable', "False"))
+                ]
+        for name in inheritable:
+            self.printer.writeline(
+                        "_mako_generate_namespace(context, %r)" % name)
+        if not len(inheritable):
+            self.printer.writeline("pass")
+        self.printer.writeline(None)
+        self.printer.writeline("def _mako_generate_namespace(context, name):")
         
         for node in namespaces.values():
             if node.attributes.has_key('import'):
                 self.compiler.has_ns_imports = True
             self.write_source_comment(node)
+            self.printer.writeline("if name == %r:" % node.name)
             if len(node.nodes):
                 self.printer.writeline("def make_namespace():")
                 export = []
@@ -332,6 +356,7 @@ class _GenerateRenderMethod(object):
                 self.printer.writeline("context['self'].%s = ns" % (node.name))
                 
             self.printer.writeline("context.namespaces[(__name__, %s)] = ns" % repr(node.name))
+            self.printer.writeline(None)
             self.printer.write("\n")
         if not len(namespaces):
             self.printer.writeline("pass")
@@ -443,6 +468,49 @@ class _GenerateRenderMethod(object):
         
         self.printer.writeline("__M_writer = context.writer()")
         
+    def coalesce_text(self, nodes):
+        """return the given list of nodes with each run of Text nodes
+        merged into a single Text node, so that the run is written
+        with one call to the writer.
+
+        a run may span nodes which produce no output of their own at
+        this point, such as comments and <%def> tags; these are kept,
+        following the merged Text node."""
+
+        coalesced = []
+        runs = {}
+        current = None
+        for node in nodes:
+            if isinstance(node, parsetree.Text):
+                if current is None:
+                    current = runs[len(coalesced)] = [node]
+                    coalesced.append(node)
+                else:
+                    current.append(node)
+            else:
+                coalesced.append(node)
+                if not self._is_silent(node):
+                    current = None
+
+        for index, run in runs.iteritems():
+            if len(run) > 1:
+                first = run[0]
+                coalesced[index] = parsetree.Text(
+                                    ''.join([n.content for n in run]),
+                                    **first.exception_kwargs)
+        return coalesced
+
+    def _is_silent(self, node):
+        """return True if visiting the given node generates no code
+        within the body of the current render callable."""
+
+        if isinstance(node, parsetree.Code):
+            return node.ismodule
+        return isinstance(node, (parsetree.Comment, 
+                                    parsetree.DefTag, 
+                                    parsetree.NamespaceTag, 
+                                    parsetree.InheritTag))
+
     def write_source_comment(self, node):
         """write a source comment containing the line number of the corresponding template line."""
         if self.last_source_line != node.lineno:
@@ -491,7 +559,7 @@ class _GenerateRenderMethod(object):
         self.write_variable_declares(identifiers)
         
         self.identifier_stack.append(identifiers)
-        for n in node.nodes:
+        for n in self.coalesce_text(node.nodes):
             n.accept_visitor(self)
         self.identifier_stack.pop()
         
@@ -611,6 +679,60 @@ class _GenerateRenderMethod(object):
                 None
             )
 
+    def write_filter_chains(self):
+        """write the module-level functions which apply the fused
+        filter chains collected by create_filter_callable()."""
+
+        chains = self.compiler.filter_chains
+        for chain, name in sorted(chains.items(), key=lambda c:c[1]):
+            self.printer.writeline("def %s(x):" % name)
+            conversion = chain[0] in _CONVERSION_FILTERS
+            escapes = set(chain[conversion and 1 or 0:])
+            if conversion and escapes.issubset(_NUMERIC_SAFE_FILTERS):
+                self.printer.writelines(
+                    "if x.__class__ is int:",
+                        "return %s(x)" % chain[0],
+                    None
+                )
+            if escapes.issubset(_MARKUP_AWARE_FILTERS):
+                self.printer.writelines(
+                    "if hasattr(x, '__html__'):",
+                        "return x.__html__()",
+                    None
+                )
+            target = "x"
+            for f in chain:
+                target = "%s(%s)" % (f, target)
+            self.printer.writelines("return %s" % target, None)
+            self.printer.write("\n\n")
+
+    def fuse_filter_chain(self, chain, target):
+        """return an expression applying the given chain of filter 
+        expressions to target via a single module-level function,
+        or None if the chain can't benefit from being fused.
+
+        a fused function tests for plain ints, which need no escaping,
+        and for objects providing __html__, which are already escaped,
+        before applying the chain itself."""
+
+        if len(chain) < 2:
+            return None
+        for f in chain:
+            if f not in _CONVERSION_FILTERS and \
+                    not _MODULE_FILTER.match(f):
+                return None
+        conversion = chain[0] in _CONVERSION_FILTERS
+        escapes = set(chain[conversion and 1 or 0:])
+        if not (conversion and escapes.issubset(_NUMERIC_SAFE_FILTERS)) \
+                and not escapes.issubset(_MARKUP_AWARE_FILTERS):
+            return None
+
+        chains = self.compiler.filter_chains
+        chain = tuple(chain)
+        if chain not in chains:
+            chains[chain] = "__M_filter_%d" % len(chains)
+        return "%s(%s)" % (chains[chain], target)
+
     def create_filter_callable(self, args, target, is_expression):
         """write a filter-applying expression based on the filters 
         present in the given filter names, adjusting for the global 
@@ -630,6 +752,7 @@ class _GenerateRenderMethod(object):
                     args = self.compiler.pagetag.filter_args.args + args
                 if self.compiler.default_filters:
                     args = self.compiler.default_filters + args
+        chain = []
         for e in args:
             # if filter given as a function, get just the identifier portion
             if e == 'n':
@@ -643,6 +766,12 @@ class _GenerateRenderMethod(object):
                 x = e
                 e = locate_encode(e)
                 assert e is not None
+            chain.append(e)
+        if is_expression:
+            fused = self.fuse_filter_chain(chain, target)
+            if fused is not None:
+                return fused
+        for e in chain:
             target = "%s(%s)" % (e, target)
         return target
         
@@ -680,7 +809,7 @@ class _GenerateRenderMethod(object):
                 "__M_writer = context._push_writer()",
                 "try:",
             )
-        for n in node.nodes:
+        for n in self.coalesce_text(node.nodes):
             n.accept_visitor(self)
         if filtered:
             self.printer.writelines(
@@ -775,7 +904,7 @@ class _GenerateRenderMethod(object):
         self.write_variable_declares(body_identifiers)
         self.identifier_stack.append(body_identifiers)
         
-        for n in node.nodes:
+        for n in self.coalesce_text(node.nodes):
             n.accept_visitor(self)
         self.identifier_stack.pop()
         
@@ -801,6 +930,27 @@ class _GenerateRenderMethod(object):
             None
         )
 
+# filters which only convert their argument to a string
+_CONVERSION_FILTERS = set(['unicode', 'str'])
+
+# escaping filters which leave the string form of an int unchanged
+_NUMERIC_SAFE_FILTERS = set([
+                    'filters.html_escape', 
+                    'filters.legacy_html_escape', 
+                    'filters.xml_escape', 
+                    'filters.html_entities_escape', 
+                    'filters.trim'])
+
+# escaping filters whose output may be replaced by the __html__() 
+# of an object that provides one; only markupsafe's escape honours it
+_MARKUP_AWARE_FILTERS = set()
+if filters.html_escape is not filters.legacy_html_escape:
+    _MARKUP_AWARE_FILTERS.add('filters.html_escape')
+
+# filters which can be referenced from module level, i.e. those 
+# supplied by mako.filters and not given arguments
+_MODULE_FILTER = re.compile(r'filters\.[\w\.]+$')
+
 class _Identifiers(object):
     """tracks the status of identifier names as template code is rendered."""
     
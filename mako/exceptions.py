@@ -53,9 +53,45 @@ class RichTraceback(object):
     
     See the usage examples in :ref:`handling_exceptions`.
     
+    The cost of building a :class:`.RichTraceback` can be bounded,
+    for instance so that a burst of errors doesn't also become a 
+    burst of CPU and disk activity, with two options, which can be
+    passed as keyword arguments or set as class attributes:
+    ``max_records``, to only extract the innermost frames of the 
+    traceback, and ``read_python_source``, which if ``False`` keeps 
+    the source files of frames that aren't templates from being read.
+    The template source and line are still found when only one 
+    record is kept::
+    
+        >>> from mako.template import Template
+        >>> try:
+        ...     Template("${1 / 0}").render()
+        ... except ZeroDivisionError:
+        ...     full = RichTraceback()
+        ...     tb = RichTraceback(max_records=1)
+        >>> len(full.records) > 1, len(tb.records), tb.lineno
+        (True, 1, 1)
+        >>> class InnermostTraceback(RichTraceback):
+        ...     max_records = 1
+        >>> try:
+        ...     Template("${1 / 0}").render()
+        ... except ZeroDivisionError:
+        ...     tb = InnermostTraceback()
+        >>> len(tb.records), tb.lineno
+        (1, 1)
+    
     """
-    def __init__(self, error=None, traceback=None):
+    
+    max_records = None
+    read_python_source = True
+    
+    def __init__(self, error=None, traceback=None, max_records=None,
+                        read_python_source=None):
         self.source, self.lineno = "", 0
+        if max_records is not None:
+            self.max_records = max_records
+        if read_python_source is not None:
+            self.read_python_source = read_python_source
 
         if error is None or traceback is None:
             t, value, tback = sys.exc_info()
@@ -129,51 +165,36 @@ class RichTraceback(object):
         source, and code line from that line number of the template."""
 
         import mako.template
-        mods = {}
+        if self.max_records is not None:
+            depth, tb = 0, trcback
+            while tb is not None:
+                depth, tb = depth + 1, tb.tb_next
+            for i in range(depth - self.max_records):
+                trcback = trcback.tb_next
         rawrecords = traceback.extract_tb(trcback)
         new_trcback = []
         for filename, lineno, function, line in rawrecords:
             if not line:
                 line = ''
             try:
-                (line_map, template_lines) = mods[filename]
+                info = mako.template._get_module_info(filename)
             except KeyError:
-                try:
-                    info = mako.template._get_module_info(filename)
-                    module_source = info.code
-                    template_source = info.source
-                    template_filename = info.template_filename or filename
-                except KeyError:
-                    # A normal .py file (not a Template)
-                    if not util.py3k:
-                        try:
-                            fp = open(filename, 'rb')
-                            encoding = util.parse_encoding(fp)
-                            fp.close()
-                        except IOError:
-                            encoding = None
-                        if encoding:
-                            line = line.decode(encoding)
-                        else:
-                            line = line.decode('ascii', 'replace')
-                    new_trcback.append((filename, lineno, function, line, 
-                                            None, None, None, None))
-                    continue
-
-                template_ln = module_ln = 1
-                line_map = {}
-                for line in module_source.split("\n"):
-                    match = re.match(r'\s*# SOURCE LINE (\d+)', line)
-                    if match:
-                        template_ln = int(match.group(1))
+                # A normal .py file (not a Template)
+                if not util.py3k:
+                    if self.read_python_source:
+                        encoding = _python_source_encoding(filename)
                     else:
-                        template_ln += 1
-                    module_ln += 1
-                    line_map[module_ln] = template_ln
-                template_lines = [line for line in
-                                    template_source.split("\n")]
-                mods[filename] = (line_map, template_lines)
-
+                        encoding = None
+                    if encoding:
+                        line = line.decode(encoding)
+                    else:
+                        line = line.decode('ascii', 'replace')
+                new_trcback.append((filename, lineno, function, line, 
+                                        None, None, None, None))
+                continue
+            
+            (line_map, template_lines, template_source) = _line_info(info)
+            template_filename = info.template_filename or filename
             template_ln = line_map[lineno]
             if template_ln <= len(template_lines):
                 template_line = template_lines[template_ln - 1]
@@ -183,13 +204,13 @@ class RichTraceback(object):
                                 line, template_filename, template_ln, 
                                 template_line, template_source))
         if not self.source:
-            for l in range(len(new_trcback)-1, 0, -1):
+            for l in range(len(new_trcback)-1, -1, -1):
                 if new_trcback[l][5]:
                     self.source = new_trcback[l][7]
                     self.lineno = new_trcback[l][5]
                     break
             else:
-                if new_trcback:
+                if new_trcback and self.read_python_source:
                     try:
                         # A normal .py file (not a Template)
                         fp = open(new_trcback[-1][0], 'rb')
@@ -204,22 +225,96 @@ class RichTraceback(object):
                     self.lineno = new_trcback[-1][1]
         return new_trcback
 
-                
+
+_source_line_re = re.compile(r'\s*# SOURCE LINE (\d+)')
+
+def _line_info(info):
+    """return a tuple of the map of module line numbers to template
+    line numbers, the lines of the template and the template source, 
+    for the given ModuleInfo.
+    
+    the result is memoised on the ModuleInfo, which lives as long as 
+    the module it describes, so that sources are only read and mapped
+    once however many errors the template raises."""
+    
+    try:
+        return info._line_info
+    except AttributeError:
+        pass
+    template_source = info.source
+    template_ln = module_ln = 1
+    line_map = {}
+    for line in info.code.split("\n"):
+        match = _source_line_re.match(line)
+        if match:
+            template_ln = int(match.group(1))
+        else:
+            template_ln += 1
+        module_ln += 1
+        line_map[module_ln] = template_ln
+    info._line_info = (line_map, template_source.split("\n"), 
+                                                template_source)
+    return info._line_info
+
+_python_encodings = {}
+
+def _python_source_encoding(filename):
+    """return the encoding declared by the given python source file,
+    memoised per filename."""
+    
+    try:
+        return _python_encodings[filename]
+    except KeyError:
+        pass
+    try:
+        fp = open(filename, 'rb')
+        try:
+            encoding = util.parse_encoding(fp)
+        finally:
+            fp.close()
+    except IOError:
+        encoding = None
+    _python_encodings[filename] = encoding
+    return encoding
+
+_error_templates = {}
+
 def text_error_template(lookup=None):
     """Provides a template that renders a stack trace in a similar format to
     the Python interpreter, substituting source template filenames, line
     numbers and code for that of the originating source template, as
     applicable.
     
+    The template accepts ``max_records`` and ``read_python_source``
+    arguments, which are passed on to :class:`.RichTraceback` to
+    bound the work of rendering it::
+    
+        >>> from mako.template import Template
+        >>> try:
+        ...     Template("${1 / 0}").render()
+        ... except ZeroDivisionError:
+        ...     text = text_error_template().render(max_records=1)
+        >>> print text.strip() # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+          File "memory:0x...", line 1, in render_body
+            ${1 / 0}
+        ZeroDivisionError: integer division or modulo by zero
+    
     """
+    try:
+        return _error_templates['text']
+    except KeyError:
+        pass
     import mako.template
-    return mako.template.Template(r"""
-<%page args="error=None, traceback=None"/>
+    _error_templates['text'] = mako.template.Template(r"""
+<%page args="error=None, traceback=None, max_records=None, read_python_source=None"/>
 <%!
     from mako.exceptions import RichTraceback
 %>\
 <%
-    tback = RichTraceback(error=error, traceback=traceback)
+    tback = RichTraceback(error=error, traceback=traceback,
+                          max_records=max_records,
+                          read_python_source=read_python_source)
 %>\
 Traceback (most recent call last):
 % for (filename, lineno, function, line) in tback.traceback:
@@ -228,6 +323,7 @@ Traceback (most recent call last):
 % endfor
 ${tback.errorname}: ${tback.message}
 """)
+    return _error_templates['text']
 
 def html_error_template():
     """Provides a template that renders a stack trace in an HTML format,
@@ -240,13 +336,22 @@ def html_error_template():
     an HTML document is returned. with the css option disabled, the default
     stylesheet won't be included.
     
+    The template is compiled the first time it's needed, and reused
+    from then on.  Like :func:`.text_error_template`, it also accepts
+    ``max_records`` and ``read_python_source`` arguments.
+    
     """
+    try:
+        return _error_templates['html']
+    except KeyError:
+        pass
     import mako.template
-    return mako.template.Template(r"""
+    _error_templates['html'] = mako.template.Template(r"""
 <%!
     from mako.exceptions import RichTraceback
 %>
-<%page args="full=True, css=True, error=None, traceback=None"/>
+<%page args="full=True, css=True, error=None, traceback=None,
+             max_records=None, read_python_source=None"/>
 % if full:
 <html>
 <head>
@@ -271,7 +376,9 @@ def html_error_template():
 
 <h2>Error !</h2>
 <%
-    tback = RichTraceback(error=error, traceback=traceback)
+    tback = RichTraceback(error=error, traceback=traceback,
+                          max_records=max_records,
+                          read_python_source=read_python_source)
     src = tback.source
     line = tback.lineno
     if src:
@@ -307,3 +414,4 @@ def html_error_template():
 </html>
 % endif
 """, output_encoding=sys.getdefaultencoding(), encoding_errors='htmlentityreplace')
+    return _error_templates['html']
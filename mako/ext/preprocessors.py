@@ -12,3 +12,34 @@ def convert_comments(text):
     t = Template(..., preprocessor=preprocess_comments)"""
     return re.sub(r'(?<=\n)\s*#[^#]', "##", text)
 
+
+_whitespace_re = re.compile(
+    r'(<(pre|textarea|script|style)\b.*?</\2\s*>|<%[\s!].*?%>)'
+    r'|(?<=>)(\s+)(?=<)|^[ \t]+|[ \t]+$', 
+    re.I | re.S | re.M)
+
+def _collapse(match):
+    if match.group(1):
+        return match.group(1)
+    if match.group(3):
+        newlines = match.group(3).count('\n')
+        if not newlines:
+            return ' '
+        return '\n' * newlines
+    return ''
+
+def collapse_whitespace(text):
+    """preprocess HTML templates to remove insignificant whitespace.
+    
+    indentation and trailing whitespace are stripped from each line, 
+    and runs of whitespace between a '>' and the following '<' are 
+    reduced to their newlines (so that line numbers in tracebacks 
+    still match the template source), or to a single space.  the 
+    content of <pre>, <textarea>, <script> and <style> elements, 
+    and of <% %> python blocks, is left untouched.
+    
+    example:
+    
+    from mako.ext.preprocessors import collapse_whitespace
+    lookup = TemplateLookup(..., preprocessor=collapse_whitespace)"""
+    return _whitespace_re.sub(_collapse, text)
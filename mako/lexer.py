@@ -70,25 +70,23 @@ class Lexer(object):
 
         mp = self.match_position
 
-        match = reg.match(self.text, self.match_position)
+        match = reg.match(self.text, mp)
         if match:
-            (start, end) = match.span()
-            if end == start:
-                self.match_position = end + 1
-            else:
-                self.match_position = end
-            self.matched_lineno = self.lineno
-            lines = re.findall(r"\n", self.text[mp:self.match_position])
-            cp = mp - 1
-            while (cp >= 0 and cp<self.textlength and self.text[cp] != '\n'):
-                cp -=1
-            self.matched_charpos = mp - cp
-            self.lineno += len(lines)
-            #print "MATCHED:", match.group(0), "LINE START:", 
-            # self.matched_lineno, "LINE END:", self.lineno
-        #print "MATCH:", regexp, "\n", self.text[mp : mp + 15], (match and "TRUE" or "FALSE")
+            self.consume(mp, match.end())
         return match
     
+    def consume(self, start, end):
+        """advance the current text position from start to end, 
+        updating the line and character positions of the match."""
+        
+        if end == start:
+            self.match_position = end + 1
+        else:
+            self.match_position = end
+        self.matched_lineno = self.lineno
+        self.matched_charpos = start - self.text.rfind('\n', 0, start)
+        self.lineno += self.text.count('\n', start, self.match_position)
+    
     def parse_until_text(self, *text):
         startpos = self.match_position
         while True:
@@ -144,6 +142,18 @@ class Lexer(object):
                                 **self.exception_kwargs)
 
     _coding_re = re.compile(r'#.*coding[:=]\s*([-\w.]+).*\r?\n')
+    
+    # one group per matcher tried by parse(), in the same order; the 
+    # group which matches names the first matcher worth trying.
+    _scanner_re = re.compile(r"""
+        (\Z)                         # end
+        |(\${)                       # expression
+        |((?<=^)[\t ]*(?:%|\#\#))     # control line
+        |(<%doc>)                    # comment
+        |(<%[\w\.\:])                # tag start
+        |(</%)                       # tag end
+        |(<%)                        # python block
+        """, re.M | re.X)
 
     def decode_raw_stream(self, text, decode_raw, known_encoding, filename):
         """given string/unicode or bytes/string, determine encoding
@@ -199,31 +209,35 @@ class Lexer(object):
         self.match_reg(self._coding_re)
         
         self.textlength = len(self.text)
-            
+        
+        # the matchers, in the order they're tried at each position.
+        # the scanner tells which of them can possibly match at the 
+        # current position, so that trying starts with that one.
+        matchers = (self.match_end, self.match_expression, 
+                    self.match_control_line, self.match_comment, 
+                    self.match_tag_start, self.match_tag_end, 
+                    self.match_python_block, self.match_text)
+        scan = self._scanner_re.match
+        
         while (True):
             if self.match_position > self.textlength: 
                 break
-        
-            if self.match_end():
-                break
-            if self.match_expression():
-                continue
-            if self.match_control_line():
-                continue
-            if self.match_comment():
-                continue
-            if self.match_tag_start(): 
-                continue
-            if self.match_tag_end():
-                continue
-            if self.match_python_block():
-                continue
-            if self.match_text(): 
-                continue
             
-            if self.match_position > self.textlength: 
+            scanned = scan(self.text, self.match_position)
+            if scanned:
+                first = scanned.lastindex - 1
+            else:
+                first = len(matchers) - 1
+            
+            for matcher in matchers[first:]:
+                if matcher():
+                    break
+            else:
+                if self.match_position > self.textlength: 
+                    break
+                raise exceptions.CompileException("assertion failed")
+            if matcher == self.match_end:
                 break
-            raise exceptions.CompileException("assertion failed")
             
         if len(self.tag):
             raise exceptions.SyntaxException("Unclosed tag: <%%%s>" % 
@@ -309,10 +323,9 @@ class Lexer(object):
         else:
             return False
     
-    def match_text(self):
-        match = self.match(r"""
-                (.*?)         # anything, followed by:
-                (
+    # the end of a run of text; searching for the first match is
+    # equivalent to matching non-greedily up to it, but much faster.
+    _text_end_re = re.compile(r"""
                  (?<=\n)(?=[ \t]*(?=%|\#\#)) # an eval or line-based 
                                              # comment preceded by a 
                                              # consumed newline and whitespace
@@ -327,15 +340,16 @@ class Lexer(object):
                  (\\\r?\n)    # an escaped newline  - throw away
                  |
                  \Z           # end of string
-                )""", re.X | re.S)
-        
-        if match:
-            text = match.group(1)
-            if text:
-                self.append_node(parsetree.Text, text)
-            return True
-        else:
-            return False
+                """, re.X | re.S)
+    
+    def match_text(self):
+        mp = self.match_position
+        match = self._text_end_re.search(self.text, mp)
+        text = self.text[mp:match.start()]
+        self.consume(mp, match.end())
+        if text:
+            self.append_node(parsetree.Text, text)
+        return True
     
     def match_python_block(self):
         match = self.match(r"<%(!)?")
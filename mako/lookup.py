@@ -160,7 +160,9 @@ class TemplateLookup(TemplateCollection):
                         strict_undefined=False,
                         imports=None, 
                         input_encoding=None, 
-                        preprocessor=None):
+                        preprocessor=None, 
+                        template_globals=None, 
+                        versioned_module_directory=False):
                         
         self.directories = [posixpath.normpath(d) for d in
                             util.to_list(directories, ())
@@ -186,7 +188,9 @@ class TemplateLookup(TemplateCollection):
             'buffer_filters':buffer_filters,  
             'strict_undefined':strict_undefined,
             'imports':imports, 
-            'preprocessor':preprocessor}
+            'preprocessor':preprocessor, 
+            'template_globals':template_globals, 
+            'versioned_module_directory':versioned_module_directory}
 
         if collection_size == -1:
             self._collection = {}
@@ -194,6 +198,7 @@ class TemplateLookup(TemplateCollection):
         else:
             self._collection = util.LRUCache(collection_size)
             self._uri_cache = util.LRUCache(collection_size)
+        self._adjusted_uris = {}
         self._mutex = threading.Lock()
         
     def get_template(self, uri):
@@ -222,13 +227,20 @@ class TemplateLookup(TemplateCollection):
     def adjust_uri(self, uri, relativeto):
         """adjust the given uri based on the given relative uri."""
         
+        key = (uri, relativeto)
+        try:
+            return self._adjusted_uris[key]
+        except KeyError:
+            pass
         if uri[0] != '/':
             if relativeto is not None:
-                return posixpath.join(posixpath.dirname(relativeto), uri)
+                v = posixpath.join(posixpath.dirname(relativeto), uri)
             else:
-                return '/' + uri
+                v = '/' + uri
         else:
-            return uri
+            v = uri
+        self._adjusted_uris[key] = v
+        return v
             
     
     def filename_to_uri(self, filename):
@@ -483,7 +483,7 @@ class PageTag(Tag):
                 attributes, 
                 ('cached', 'cache_key', 'cache_timeout', 
                 'cache_type', 'cache_dir', 'cache_url', 
-                'args', 'expression_filter'), 
+                'args', 'expression_filter', 'cached_output'), 
                 (), 
                 (), 
                 **kwargs)
@@ -8,7 +8,12 @@
 Namespace, and various helper functions."""
 
 from mako import exceptions, util
-import __builtin__, inspect, sys
+import __builtin__, inspect, sys, Queue
+
+try:
+    import threading
+except:
+    import dummy_threading as threading
 
 class Context(object):
     """Provides runtime namespace, output buffer, and various
@@ -25,14 +30,20 @@ class Context(object):
         # original data, minus the builtins
         self._orig = data
         
-        # the context data which includes builtins
-        self._data = __builtin__.__dict__.copy()
-        self._data.update(data)
-        self._kwargs = data.copy()
+        # the context data is read through two layers; per-render
+        # values in _data, and the builtins (plus any template
+        # globals) in _base, which is shared and never written to
+        self._base = __builtin__.__dict__
+        self._data = data.copy()
+        self._kwargs = data
         self._with_template = None
         self._outputting_as_unicode = None
         self.namespaces = {}
         
+        # if a list, every template looked up during the render 
+        # is appended to it
+        self._dependencies = None
+        
         # "capture" function which proxies to the 
         # generic "capture" function
         self._data['capture'] = util.partial(capture, self)
@@ -72,10 +83,12 @@ class Context(object):
     def keys(self):
         """Return a list of all names established in this :class:`.Context`."""
 
-        return self._data.keys()
+        return list(set(self._base).union(self._data))
         
     def __getitem__(self, key):
-        return self._data[key]
+        if key in self._data:
+            return self._data[key]
+        return self._base[key]
 
     def _push_writer(self):
         """push a capturing buffer onto this Context and return
@@ -107,7 +120,9 @@ class Context(object):
     def get(self, key, default=None):
         """Return a value from this :class:`.Context`."""
         
-        return self._data.get(key, default)
+        if key in self._data:
+            return self._data[key]
+        return self._base.get(key, default)
         
     def write(self, string):
         """Write a string to this :class:`.Context` object's
@@ -123,6 +138,7 @@ class Context(object):
     def _copy(self):
         c = Context.__new__(Context)
         c._buffer_stack = self._buffer_stack
+        c._base = self._base
         c._data = self._data.copy()
         c._orig = self._orig
         c._kwargs = self._kwargs
@@ -130,6 +146,7 @@ class Context(object):
         c._outputting_as_unicode = self._outputting_as_unicode
         c.namespaces = self.namespaces
         c.caller_stack = self.caller_stack
+        c._dependencies = self._dependencies
         return c
         
     def locals_(self, d):
@@ -417,21 +434,25 @@ class Namespace(object):
                             
     def __getattr__(self, key):
         if self.callables and key in self.callables:
-            return self.callables[key]
-
-        if self.template and self.template.has_def(key):
+            val = self.callables[key]
+        elif self.template and self.template.has_def(key):
             callable_ = self.template._get_def_callable(key)
-            return util.partial(callable_, self.context)
-
-        if self._module and hasattr(self._module, key):
+            val = util.partial(callable_, self.context)
+        elif self._module and hasattr(self._module, key):
             callable_ = getattr(self._module, key)
-            return util.partial(callable_, self.context)
-
-        if self.inherits is not None:
-            return getattr(self.inherits, key)
-        raise AttributeError(
+            val = util.partial(callable_, self.context)
+        elif self.inherits is not None:
+            val = getattr(self.inherits, key)
+        else:
+            raise AttributeError(
                     "Namespace '%s' has no member '%s'" % 
                     (self.name, key))
+        
+        # the inheritance chain is established before any
+        # lookups are made against it, so a resolved member
+        # can be kept for the lifetime of this Namespace
+        setattr(self, key, val)
+        return val
 
 def supports_caller(func):
     """Apply a caller_stack compatibility decorator to a plain
@@ -508,7 +529,7 @@ def _inherit_from(context, uri, calling_uri):
 
     if uri is None:
         return None
-    template = _lookup_template(context, uri, calling_uri)
+    template = _lookup_parent(context, uri, calling_uri)
     self_ns = context['self']
     ih = self_ns
     while ih.inherits is not None:
@@ -530,6 +551,42 @@ def _inherit_from(context, uri, calling_uri):
         gen_ns(context)
     return (template.callable_, lclcontext)
 
+def _lookup_parent(context, uri, calling_uri):
+    """return the template inherited by the template at calling_uri.
+    
+    the result is memoised on the template being rendered, for 
+    lookups which keep their templates in a collection.  a memoised
+    parent is only used while it's the one in the lookup's collection,
+    so it's dropped once the lookup reloads it, and if the lookup 
+    checks the filesystem it's still checked on every render."""
+    
+    with_template = context._with_template
+    lookup = with_template.lookup
+    collection = getattr(lookup, '_collection', None)
+    if collection is None:
+        return _lookup_template(context, uri, calling_uri)
+    key = (uri, calling_uri)
+    try:
+        parents = with_template._parents
+    except AttributeError:
+        parents = with_template._parents = {}
+    try:
+        adjusted, template = parents[key]
+        current = collection[adjusted]
+    except KeyError:
+        current = None
+    if current is not None and current is template:
+        if lookup.filesystem_checks:
+            template = lookup._check(adjusted, template)
+            if template is not current:
+                parents[key] = (adjusted, template)
+        if context._dependencies is not None:
+            context._dependencies.append(template)
+        return template
+    template = _lookup_template(context, uri, calling_uri)
+    parents[key] = (lookup.adjust_uri(uri, calling_uri), template)
+    return template
+
 def _lookup_template(context, uri, relativeto):
     lookup = context._with_template.lookup
     if lookup is None:
@@ -538,9 +595,12 @@ def _lookup_template(context, uri, relativeto):
                             context._with_template.uri)
     uri = lookup.adjust_uri(uri, relativeto)
     try:
-        return lookup.get_template(uri)
+        template = lookup.get_template(uri)
     except exceptions.TopLevelLookupException, e:
         raise exceptions.TemplateLookupException(str(e))
+    if context._dependencies is not None:
+        context._dependencies.append(template)
+    return template
 
 def _populate_self_namespace(context, template, self_ns=None):
     if self_ns is None:
@@ -554,9 +614,13 @@ def _populate_self_namespace(context, template, self_ns=None):
             return ret
     return (template.callable_, context)
 
-def _render(template, callable_, args, data, as_unicode=False):
+def _render(template, callable_, args, data, as_unicode=False, 
+                        dependencies=None):
     """create a Context and return the string 
-    output of the given template and template callable."""
+    output of the given template and template callable.
+    
+    if ``dependencies`` is a list, the templates looked up during 
+    the render are appended to it."""
 
     if as_unicode:
         buf = util.FastEncodingBuffer(unicode=True)
@@ -568,32 +632,164 @@ def _render(template, callable_, args, data, as_unicode=False):
     else:
         buf = util.StringIO()
     context = Context(buf, **data)
+    context._base = template._globals
     context._outputting_as_unicode = as_unicode
     context._with_template = template
+    context._dependencies = dependencies
     
     _render_context(template, callable_, context, *args, 
                             **_kwargs_for_callable(callable_, data))
     return context._pop_buffer().getvalue()
 
-def _kwargs_for_callable(callable_, data):
+class _RenderAbandoned(Exception):
+    """raised within a streaming render whose consumer has gone away."""
+
+class _RenderFailed(object):
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+_STREAM_DONE = object()
+
+stream_thread_hooks = []
+"""Callables which carry thread local state over to the thread a
+streamed render runs in.  Each is called in the thread which starts 
+iterating over the output, and returns a callable which is then 
+called in the rendering thread, before the template runs::
+
+    def carry_user(): 
+        user = my_locals.user
+        def restore():
+            my_locals.user = user
+        return restore
+    
+    runtime.stream_thread_hooks.append(carry_user)
+
+"""
+
+def _render_iter(template, callable_, args, data, as_unicode=False,
+                        chunk_size=8192, queue_size=4):
+    """create a Context and return an iterator over chunks of the
+    output of the given template and template callable.
+
+    The template is executed in a separate thread, which hands
+    over a chunk each time more than ``chunk_size`` characters have
+    been written at the top level of the template; at most
+    ``queue_size`` chunks are held in memory at once.  Exceptions
+    raised by the template are re-raised from the iterator.
+
+    Thread local state is carried over to the rendering thread by
+    the :data:`stream_thread_hooks`, and the profiling stats of the
+    render are added to those of the iterating thread when it ends.
+
+    """
+
+    restores = [capture() for capture in stream_thread_hooks]
+    profiler = getattr(template.module, '_mako_profiler', None)
+    profile = []
+    chunks = Queue.Queue(queue_size)
+    abandoned = threading.Event()
+
+    def flush(chunk):
+        if abandoned.isSet():
+            raise _RenderAbandoned()
+        chunks.put(chunk)
+
+    if as_unicode:
+        buf = util.ChunkedEncodingBuffer(flush, chunk_size, unicode=True)
+    else:
+        buf = util.ChunkedEncodingBuffer(
+                        flush,
+                        chunk_size,
+                        encoding=template.output_encoding,
+                        errors=template.encoding_errors)
+    context = Context(buf, **data)
+    context._base = template._globals
+    context._outputting_as_unicode = as_unicode
+    context._with_template = template
+
+    def produce():
+        try:
+            try:
+                for restore in restores:
+                    restore()
+                _render_context(template, callable_, context, *args,
+                                **_kwargs_for_callable(callable_, data))
+                remainder = context._pop_buffer().getvalue()
+                if remainder:
+                    chunks.put(remainder)
+            except _RenderAbandoned:
+                pass
+            except:
+                chunks.put(_RenderFailed(sys.exc_info()))
+        finally:
+            if profiler is not None:
+                profile.append(profiler.collect())
+            chunks.put(_STREAM_DONE)
+
+    worker = threading.Thread(target=produce)
+    worker.setDaemon(True)
+    worker.start()
+
+    item = None
+    try:
+        while True:
+            item = chunks.get()
+            if item is _STREAM_DONE:
+                break
+            elif isinstance(item, _RenderFailed):
+                exc_info, item.exc_info = item.exc_info, None
+                raise exc_info[0], exc_info[1], exc_info[2]
+            yield item
+    finally:
+        # if the consumer stopped early, let the producer run into
+        # _RenderAbandoned and drain whatever it puts meanwhile
+        abandoned.set()
+        while item is not _STREAM_DONE:
+            item = chunks.get()
+        worker.join()
+        if profile:
+            profiler._add_collected(profile[0])
+
+def _argspec_for_callable(callable_):
+    """return a tuple of (accepts **kwargs, names of arguments other
+    than 'context') for the given rendering callable.
+
+    the result is memoised on the callable itself, so that repeated
+    renders don't need to introspect it again."""
+
+    try:
+        return callable_._mako_argspec
+    except AttributeError:
+        pass
     argspec = inspect.getargspec(callable_)
+    namedargs = argspec[0] + [v for v in argspec[1:3] if v is not None]
+    spec = (
+        bool(argspec[2]), 
+        tuple([arg for arg in namedargs if arg != 'context'])
+    )
+    try:
+        callable_._mako_argspec = spec
+    except (AttributeError, TypeError):
+        pass
+    return spec
+
+def _kwargs_for_callable(callable_, data):
+    varkw, namedargs = _argspec_for_callable(callable_)
     # for normal pages, **pageargs is usually present
-    if argspec[2]:
+    if varkw:
         return data
     
     # for rendering defs from the top level, figure out the args
-    namedargs = argspec[0] + [v for v in argspec[1:3] if v is not None]
     kwargs = {}
     for arg in namedargs:
-        if arg != 'context' and arg in data and arg not in kwargs:
+        if arg in data and arg not in kwargs:
             kwargs[arg] = data[arg]
     return kwargs
 
 def _kwargs_for_include(callable_, data, **kwargs):
-    argspec = inspect.getargspec(callable_)
-    namedargs = argspec[0] + [v for v in argspec[1:3] if v is not None]
+    varkw, namedargs = _argspec_for_callable(callable_)
     for arg in namedargs:
-        if arg != 'context' and arg in data and arg not in kwargs:
+        if arg in data and arg not in kwargs:
             kwargs[arg] = data[arg]
     return kwargs
     
@@ -648,3 +844,173 @@ def _render_error(template, context, error):
                                             
         context._with_template = error_template
         error_template.render_context(context, error=error)
+
+class TemplateProfiler(object):
+    """Times the rendering callables of template modules; the
+    ``render_body`` of each template, which is also what runs when
+    it's included or inherited from, and each of its top-level
+    ``<%def>`` s.
+    
+    Both inclusive times, and exclusive times which leave out the
+    time spent in other timed callables, are collected.  They're
+    aggregated across all renders in :attr:`stats`, and also kept 
+    per thread until :meth:`collect` is called, for instance at the 
+    end of each request.
+    
+    See :func:`enable_profiling`.
+    
+    The stats of a streamed render are collected by the thread which
+    iterates over its output::
+    
+        >>> from mako.template import Template
+        >>> profiler = enable_profiling()
+        >>> t = Template("hello", uri="hello.html")
+        >>> disable_profiling()
+        >>> print ''.join(t.render_iter())
+        hello
+        >>> profiler.collect().keys()
+        [('hello.html', None)]
+    
+    """
+    
+    def __init__(self):
+        self.stats = {}
+        self._local = threading.local()
+        self._mutex = threading.Lock()
+        
+    def instrument(self, module):
+        """replace the rendering callables of the given template 
+        module with timed versions of themselves."""
+        
+        if getattr(module, '_mako_profiler', None) is not None:
+            return
+        module._mako_profiler = self
+        for name, fn in module.__dict__.items():
+            if name.startswith('render_') and \
+                    isinstance(fn, type(_render_error)):
+                setattr(module, name, 
+                        self._timed(module._template_uri, name[7:], fn))
+    
+    def _timed(self, uri, name, fn):
+        if name == 'body':
+            key = (uri, None)
+        else:
+            key = (uri, name)
+        local = self._local
+        
+        def timed(*args, **kwargs):
+            try:
+                stack = local.stack
+            except AttributeError:
+                stack = local.stack = []
+                local.stats = {}
+            stack.append(0)
+            start = util.time_func()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = util.time_func() - start
+                own = elapsed - stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                self._record(local.stats, key, elapsed, own)
+        
+        timed.__name__ = fn.__name__
+        timed.__doc__ = fn.__doc__
+        timed._mako_argspec = _argspec_for_callable(fn)
+        timed._mako_profiled = fn
+        return timed
+    
+    def _record(self, stats, key, elapsed, own):
+        _add_timing(stats, key, elapsed, own)
+        self._mutex.acquire()
+        try:
+            _add_timing(self.stats, key, elapsed, own)
+        finally:
+            self._mutex.release()
+    
+    def collect(self):
+        """return the stats recorded in the current thread since the 
+        last call to :meth:`collect`, and start a new set.
+        
+        Stats are a dictionary of ``(uri, def name)`` (the def name 
+        being ``None`` for the template body) to a list of 
+        ``[calls, inclusive seconds, exclusive seconds]``."""
+        
+        stats = getattr(self._local, 'stats', {})
+        self._local.stats = {}
+        return stats
+    
+    def _add_collected(self, stats):
+        """add stats collected in another thread, which rendered on 
+        behalf of the current one, to those of the current thread."""
+        
+        local = self._local
+        try:
+            local_stats = local.stats
+        except AttributeError:
+            local.stack = []
+            local_stats = local.stats = {}
+        for key, (calls, elapsed, own) in stats.items():
+            try:
+                s = local_stats[key]
+            except KeyError:
+                s = local_stats[key] = [0, 0, 0]
+            s[0] += calls
+            s[1] += elapsed
+            s[2] += own
+    
+    def reset(self):
+        """discard the aggregated stats."""
+        
+        self.stats = {}
+    
+    def report(self, stats=None, limit=20):
+        """return a text table of the given stats, by default those 
+        aggregated across all renders, slowest exclusive time first."""
+        
+        if stats is None:
+            stats = self.stats
+        rows = sorted(stats.items(), key=lambda item: item[1][2], 
+                                            reverse=True)[:limit]
+        lines = ["%-50s %8s %12s %12s" % 
+                    ("template / def", "calls", "total ms", "own ms")]
+        for (uri, name), (calls, elapsed, own) in rows:
+            if name is None:
+                label = uri
+            else:
+                label = "%s:%s()" % (uri, name)
+            lines.append("%-50s %8d %12.3f %12.3f" % 
+                            (label, calls, elapsed * 1000, own * 1000))
+        return "\n".join(lines)
+
+def _add_timing(stats, key, elapsed, own):
+    try:
+        s = stats[key]
+    except KeyError:
+        s = stats[key] = [0, 0, 0]
+    s[0] += 1
+    s[1] += elapsed
+    s[2] += own
+
+_profiler = None
+
+def enable_profiling(profiler=None):
+    """Instrument every template module loaded from now on with the
+    given :class:`.TemplateProfiler`, or a new one, and return it.
+    
+    Templates which are already loaded aren't affected, so this is 
+    usually called at startup.
+    
+    """
+    global _profiler
+    if profiler is None:
+        profiler = TemplateProfiler()
+    _profiler = profiler
+    return profiler
+
+def disable_profiling():
+    """Stop instrumenting newly loaded template modules."""
+    
+    global _profiler
+    _profiler = None
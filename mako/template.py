@@ -10,7 +10,7 @@ template strings, as well as template runtime operations."""
 
 from mako.lexer import Lexer
 from mako import runtime, util, exceptions, codegen
-import imp, os, re, shutil, stat, sys, tempfile, time, types, weakref
+import __builtin__, imp, os, re, shutil, stat, sys, tempfile, time, types, weakref
 
     
 class Template(object):
@@ -96,6 +96,12 @@ class Template(object):
     :param module_filename: Overrides the filename of the generated 
      Python module file. For advanced usage only.
     
+    :param versioned_module_directory: if ``True``, module files are 
+     placed in a subdirectory of ``module_directory`` named for the 
+     Python version and the version of Mako's code generator, so that
+     applications running different versions can share the same
+     ``module_directory`` without regenerating each other's modules.
+    
     :param output_encoding: The encoding to use when :meth:`.render` 
      is called. See :ref:`usage_unicode` as well as
      :ref:`unicode_toplevel`.
@@ -105,6 +111,14 @@ class Template(object):
      result of the callable will be used as the template source
      code.
      
+    :param template_globals: Dictionary of names which will be 
+     available to the template in addition to Python's builtins,
+     such as helper functions shared by all templates.  Unlike 
+     the keyword arguments passed to :meth:`.render`, these are
+     held in a layer of the :class:`.Context` which is shared 
+     between renders, so their number doesn't add to the cost 
+     of each render.
+    
     :param strict_undefined: Replaces the automatic usage of 
      ``UNDEFINED`` for any undeclared variables not located in
      the :class:`.Context` with an immediate raise of
@@ -142,7 +156,9 @@ class Template(object):
                     strict_undefined=False,
                     imports=None, 
                     preprocessor=None, 
-                    cache_enabled=True):
+                    cache_enabled=True, 
+                    template_globals=None, 
+                    versioned_module_directory=False):
         if uri:
             self.module_id = re.sub(r'\W', "_", uri)
             self.uri = uri
@@ -160,6 +176,8 @@ class Template(object):
         self.encoding_errors = encoding_errors
         self.disable_unicode = disable_unicode
         self.strict_undefined = strict_undefined
+        self.template_globals = template_globals
+        self._globals = _merge_globals(template_globals)
 
         if util.py3k and disable_unicode:
             raise exceptions.UnsupportedError(
@@ -190,6 +208,9 @@ class Template(object):
             if module_filename is not None:
                 path = module_filename
             elif module_directory is not None:
+                if versioned_module_directory:
+                    module_directory = os.path.join(
+                                        module_directory, _MODULE_VERSION)
                 u = self.uri
                 if u[0] == '/':
                     u = u[1:]
@@ -222,23 +243,27 @@ class Template(object):
         if path is not None:
             util.verify_directory(os.path.dirname(path))
             filemtime = os.stat(filename)[stat.ST_MTIME]
-            if not os.path.exists(path) or \
-                        os.stat(path)[stat.ST_MTIME] < filemtime:
-                _compile_module_file(
-                            self, 
-                            open(filename, 'rb').read(), 
-                            filename, 
-                            path)
-            module = imp.load_source(self.module_id, path, open(path, 'rb'))
-            del sys.modules[self.module_id]
-            if module._magic_number != codegen.MAGIC_NUMBER:
-                _compile_module_file(
-                            self, 
-                            open(filename, 'rb').read(), 
-                            filename, 
-                            path)
-                module = imp.load_source(self.module_id, path, open(path, 'rb'))
-                del sys.modules[self.module_id]
+            module = self._load_module_file(path, filemtime)
+            if module is None:
+                # compile while holding a lock on the module file, so 
+                # that of several processes sharing the module_directory
+                # only one compiles the template; the others wait, then 
+                # load the module it wrote.
+                lock = util.FileLock(path + '.lock')
+                lock.acquire()
+                try:
+                    module = self._load_module_file(path, filemtime)
+                    if module is None:
+                        _compile_module_file(
+                                    self, 
+                                    open(filename, 'rb').read(), 
+                                    filename, 
+                                    path)
+                        module = imp.load_source(
+                                    self.module_id, path, open(path, 'rb'))
+                        del sys.modules[self.module_id]
+                finally:
+                    lock.release()
             ModuleInfo(module, path, self, filename, None, None)
         else:
             # template filename and no module directory, compile code
@@ -252,6 +277,20 @@ class Template(object):
             ModuleInfo(module, None, self, filename, code, None)
         return module
         
+    def _load_module_file(self, path, filemtime):
+        """load the module file at the given path, or return None 
+        if it's missing, older than ``filemtime`` or was generated 
+        by another version of the code generator."""
+        
+        if not os.path.exists(path) or \
+                    os.stat(path)[stat.ST_MTIME] < filemtime:
+            return None
+        module = imp.load_source(self.module_id, path, open(path, 'rb'))
+        del sys.modules[self.module_id]
+        if module._magic_number != codegen.MAGIC_NUMBER:
+            return None
+        return module
+        
     @property
     def source(self):
         """return the template source code for this Template."""
@@ -282,6 +321,18 @@ class Template(object):
         """
         return runtime._render(self, self.callable_, args, data)
     
+    def render_with_dependencies(self, *args, **data):
+        """Render the output of this template as per :meth:`render`, 
+        and return it along with a list of the templates looked up 
+        during the render; those inherited from, included, or
+        imported as namespaces.
+        
+        """
+        dependencies = []
+        output = runtime._render(self, self.callable_, args, data, 
+                                    dependencies=dependencies)
+        return output, dependencies
+    
     def render_unicode(self, *args, **data):
         """render the output of this template as a unicode object."""
         
@@ -291,6 +342,46 @@ class Template(object):
                                 data, 
                                 as_unicode=True)
         
+    stream_chunk_size = 8192
+    """Approximate number of characters :meth:`render_iter` collects
+    before handing a chunk of output to the consumer."""
+
+    def render_iter(self, *args, **data):
+        """Render the output of this template as an iterator of strings.
+
+        The template runs in a separate thread, and output written
+        at the top level of the template is handed over in chunks of
+        roughly :attr:`stream_chunk_size` characters as it is produced,
+        so the first bytes can be sent before the render has
+        completed.  The strings are encoded as per :meth:`render`.
+        
+        Thread local values aren't visible to the template unless
+        they're carried over by :data:`.runtime.stream_thread_hooks`::
+        
+            >>> import threading
+            >>> from mako import runtime
+            >>> state = threading.local()
+            >>> state.value = 1
+            >>> def carry_value():
+            ...     value = state.value
+            ...     def restore():
+            ...         state.value = value
+            ...     return restore
+            >>> runtime.stream_thread_hooks.append(carry_value)
+            >>> t = Template("${getattr(state, 'value', 'MISSING')}")
+            >>> print ''.join(t.render_iter(state=state))
+            1
+            >>> runtime.stream_thread_hooks.remove(carry_value)
+            >>> print ''.join(t.render_iter(state=state))
+            MISSING
+
+        """
+        return runtime._render_iter(self,
+                                self.callable_,
+                                args,
+                                data,
+                                chunk_size=self.stream_chunk_size)
+        
     def render_context(self, context, *args, **kwargs):
         """Render this Template with the given context.  
         
@@ -299,6 +390,7 @@ class Template(object):
         """
         if getattr(context, '_with_template', None) is None:
             context._with_template = self
+            context._base = self._globals
         runtime._render_context(self, 
                                 self.callable_, 
                                 context, 
@@ -306,7 +398,7 @@ class Template(object):
                                 **kwargs)
     
     def has_def(self, name):
-        return hasattr(self.module, "render_%s" % name)
+        return self._lookup_def(name) is not None
         
     def get_def(self, name):
         """Return a def of this template as a :class:`.DefTemplate`."""
@@ -314,12 +406,38 @@ class Template(object):
         return DefTemplate(self, getattr(self.module, "render_%s" % name))
 
     def _get_def_callable(self, name):
-        return getattr(self.module, "render_%s" % name)
+        callable_ = self._lookup_def(name)
+        if callable_ is None:
+            return getattr(self.module, "render_%s" % name)
+        return callable_
+    
+    def _lookup_def(self, name):
+        """Return the rendering callable for the def of the given 
+        name, or ``None``, memoised for the lifetime of this 
+        :class:`.Template`."""
+        
+        try:
+            return self._defs[name]
+        except AttributeError:
+            self._defs = {}
+        except KeyError:
+            pass
+        callable_ = getattr(self.module, "render_%s" % name, None)
+        self._defs[name] = callable_
+        return callable_
     
     @property
     def last_modified(self): 
         return self.module._modified_time    
     
+    @property
+    def cached_output(self):
+        """``True`` if the template declares, via 
+        ``<%page cached_output="True"/>``, that its output depends 
+        only on its arguments and may be memoised by the caller."""
+        
+        return getattr(self.module, '_cached_output', False)
+    
 class ModuleTemplate(Template):
     """A Template which is constructed given an existing Python module.
     
@@ -352,7 +470,8 @@ class ModuleTemplate(Template):
                         cache_type=None,
                         cache_dir=None, 
                         cache_url=None, 
-                        cache_enabled=True
+                        cache_enabled=True, 
+                        template_globals=None
     ):
         self.module_id = re.sub(r'\W', "_", module._template_uri)
         self.uri = module._template_uri
@@ -360,6 +479,8 @@ class ModuleTemplate(Template):
         self.output_encoding = output_encoding
         self.encoding_errors = encoding_errors
         self.disable_unicode = disable_unicode
+        self.template_globals = template_globals
+        self._globals = _merge_globals(template_globals)
         self.module = module
         self.filename = template_filename
         ModuleInfo(module, 
@@ -391,6 +512,8 @@ class DefTemplate(Template):
         self.format_exceptions = parent.format_exceptions
         self.error_handler = parent.error_handler
         self.lookup = parent.lookup
+        self.template_globals = parent.template_globals
+        self._globals = parent._globals
 
     def get_def(self, name):
         return self.parent.get_def(name)
@@ -416,6 +539,8 @@ class ModuleInfo(object):
         self.module_source = module_source
         self.template_source = template_source
         self._modules[module.__name__] = template._mmarker = self
+        if runtime._profiler is not None:
+            runtime._profiler.instrument(module)
         if module_filename:
             self._modules[module_filename] = self
     
@@ -442,6 +567,19 @@ class ModuleInfo(object):
             else:
                 return open(self.template_filename).read()
         
+_MODULE_VERSION = "py%d.%d-%d" % (sys.version_info[:2] + 
+                                    (codegen.MAGIC_NUMBER,))
+
+def _merge_globals(template_globals):
+    """return the dictionary which forms the shared base layer of
+    a Context; the builtins, updated with the given globals."""
+    
+    if not template_globals:
+        return __builtin__.__dict__
+    d = __builtin__.__dict__.copy()
+    d.update(template_globals)
+    return d
+    
 def _compile_text(template, text, filename):
     identifier = template.module_id
     lexer = Lexer(text, 
@@ -498,11 +636,19 @@ def _compile_module_file(template, text, filename, outputpath):
     if isinstance(source, unicode):
         source = source.encode(lexer.encoding or 'ascii')
         
-    os.write(dest, source)
-    os.close(dest)
-    shutil.move(name, outputpath)
+    try:
+        try:
+            os.write(dest, source)
+        finally:
+            os.close(dest)
+        shutil.move(name, outputpath)
+    except:
+        if os.path.exists(name):
+            os.remove(name)
+        raise
 
 def _get_module_info_from_callable(callable_):
+    callable_ = getattr(callable_, '_mako_profiled', callable_)
     return _get_module_info(callable_.func_globals['__name__'])
     
 def _get_module_info(filename):
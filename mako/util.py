@@ -29,6 +29,11 @@ except ImportError:
     import dummy_threading as threading
     import dummy_thread as thread
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 if win32 or jython:
     time_func = time.clock
 else:
@@ -80,6 +85,35 @@ def verify_directory(dir):
             if tries > 5:
                 raise
 
+class FileLock(object):
+    """an exclusive lock on a file, held across processes.
+    
+    where fcntl isn't available, acquire() and release() do 
+    nothing."""
+    
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        
+    def acquire(self):
+        if fcntl is None:
+            return
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0666)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except:
+            os.close(self._fd)
+            self._fd = None
+            raise
+    
+    def release(self):
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
 def to_list(x, default=None):
     if x is None:
         return default
@@ -126,6 +160,36 @@ class FastEncodingBuffer(object):
         else:
             return self.delim.join(self.data)
 
+class ChunkedEncodingBuffer(FastEncodingBuffer):
+    """a FastEncodingBuffer which hands its content to a callable
+    in chunks, as soon as at least ``chunk_size`` characters have
+    been written, rather than holding the full output until
+    getvalue() is called.
+
+    getvalue() returns whatever has been written since the last
+    chunk was handed off."""
+
+    def __init__(self, flush, chunk_size=8192, encoding=None,
+                        errors='strict', unicode=False):
+        FastEncodingBuffer.__init__(self, encoding=encoding,
+                                        errors=errors, unicode=unicode)
+        self.flush = flush
+        self.chunk_size = chunk_size
+        self.size = 0
+        self.write = self._write
+
+    def _write(self, text):
+        self.data.append(text)
+        self.size += len(text)
+        if self.size >= self.chunk_size:
+            chunk = self.getvalue()
+            self.truncate()
+            self.flush(chunk)
+
+    def truncate(self):
+        del self.data[:]
+        self.size = 0
+
 class LRUCache(dict):
     """A dictionary-like object that stores a limited number of items, discarding
     lesser used items periodically.
@@ -12,7 +12,8 @@ import re
 from itertools import imap
 
 
-__all__ = ['Markup', 'soft_unicode', 'escape', 'escape_silent']
+__all__ = ['Markup', 'MarkupBuilder', 'soft_unicode', 'escape',
+           'escape_silent', 'escape_many']
 
 
 _striptags_re = re.compile(r'(<!--.*?-->|<[^>]*>)')
@@ -221,9 +222,64 @@ class _MarkupEscapeHelper(object):
     __float__ = lambda s: float(s.obj)
 
 
+class MarkupBuilder(object):
+    """Assembles a markup string from many parts without creating an
+    intermediate :class:`Markup` object for each concatenation.  Parts
+    added with :meth:`append` are escaped, parts added with
+    :meth:`append_raw` are trusted as they are:
+
+    >>> b = MarkupBuilder()
+    >>> b.append_raw('<ul>')
+    >>> b.extend(['1 < 2', Markup('<em>3</em>')], '<li>%s</li>')
+    >>> b.append_raw('</ul>')
+    >>> b.build()
+    Markup(u'<ul><li>1 &lt; 2</li><li><em>3</em></li></ul>')
+
+    The builder can be passed wherever markup is expected, as it
+    implements the `__html__` interface.
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def append(self, s):
+        """Escape `s` and add it to the output."""
+        self.parts.append(escape(s))
+
+    def append_raw(self, s):
+        """Add `s` to the output as it is, which must only be done with
+        strings that are known to be safe.
+        """
+        self.parts.append(soft_unicode(s))
+
+    def extend(self, iterable, wrapper=None):
+        """Escape every item of `iterable` in one batch and add them to the
+        output.  If `wrapper` is given it's a trusted format string each
+        escaped item is interpolated into.
+        """
+        escaped = escape_many(iterable)
+        if wrapper is not None:
+            wrapper = soft_unicode(wrapper)
+            escaped = [wrapper % item for item in imap(unicode, escaped)]
+        self.parts.extend(escaped)
+
+    def build(self):
+        """Return the output as one :class:`Markup` object."""
+        return Markup(u''.join(self.parts))
+
+    __html__ = build
+
+    def __len__(self):
+        return len(self.parts)
+
+    def __repr__(self):
+        return '<%s %d parts>' % (self.__class__.__name__, len(self.parts))
+
+
 # we have to import it down here as the speedups and native
 # modules imports the markup type which is define above.
 try:
     from markupsafe._speedups import escape, escape_silent, soft_unicode
 except ImportError:
     from markupsafe._native import escape, escape_silent, soft_unicode
+from markupsafe._native import escape_many
@@ -36,6 +36,40 @@ def escape_silent(s):
     return escape(s)
 
 
+def escape_many(iterable):
+    """Escape every item of `iterable` as :func:`escape` does and return a
+    list of markup strings.  The items are joined and escaped in a single
+    pass and split again afterwards, which is considerably cheaper than
+    escaping many short strings one at a time.
+    """
+    items = []
+    html = {}
+    for idx, item in enumerate(iterable):
+        if hasattr(item, '__html__'):
+            html[idx] = Markup(item.__html__())
+            item = u''
+        elif not isinstance(item, unicode):
+            item = unicode(item)
+        items.append(item)
+    if not items:
+        return []
+    joined = u'\x00'.join(items)
+    if joined.count(u'\x00') != len(items) - 1:
+        # one of the strings contains the separator itself
+        return [html[idx] if idx in html else escape(item)
+                for idx, item in enumerate(items)]
+    rv = map(Markup, joined
+        .replace('&', '&amp;')
+        .replace('>', '&gt;')
+        .replace('<', '&lt;')
+        .replace("'", '&#39;')
+        .replace('"', '&#34;')
+        .split(u'\x00'))
+    for idx, value in html.iteritems():
+        rv[idx] = value
+    return rv
+
+
 def soft_unicode(s):
     """Make a string unicode if it isn't already.  That way a markup
     string is not converted back to unicode.
@@ -1,6 +1,7 @@
 import gc
 import unittest
-from markupsafe import Markup, escape, escape_silent
+from markupsafe import Markup, MarkupBuilder, escape, escape_silent, \
+     escape_many
 
 
 class MarkupTestCase(unittest.TestCase):
@@ -50,6 +51,38 @@ class MarkupTestCase(unittest.TestCase):
         assert escape(None) == Markup(None)
         assert escape_silent('<foo>') == Markup(u'&lt;foo&gt;')
 
+    def test_escape_many(self):
+        items = ['<foo>', u'"bar" & \'baz\'', Markup('<em>ok</em>'), 42, '']
+        result = escape_many(items)
+        assert result == [escape(item) for item in items]
+        assert all(type(item) is Markup for item in result)
+        assert escape_many([]) == []
+
+        # strings containing the separator are escaped one at a time
+        assert escape_many([u'a\x00<', u'>']) == [u'a\x00&lt;', u'&gt;']
+
+        # whatever __html__ returns is marked up, so it isn't escaped again
+        class Html(object):
+            def __html__(self):
+                return '<b>'
+        for items in ([Html(), '<'], [Html(), u'a\x00<']):
+            result = escape_many(items)
+            assert all(type(item) is Markup for item in result)
+            assert result[0] + result[1] == Markup('<b>') + items[1]
+
+    def test_markup_builder(self):
+        builder = MarkupBuilder()
+        builder.append_raw('<p>')
+        builder.append('<script>')
+        builder.append(Markup('<br>'))
+        builder.extend(['a & b', 'c'], '<i>%s</i>')
+        builder.append_raw('</p>')
+        result = builder.build()
+        assert type(result) is Markup
+        assert result == '<p>&lt;script&gt;<br><i>a &amp; b</i><i>c</i></p>'
+        assert Markup('<div>%s</div>') % builder == '<div>%s</div>' % result
+        assert len(builder) == 6
+
 
 class MarkupLeakTestCase(unittest.TestCase):
 
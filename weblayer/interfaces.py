@@ -110,6 +110,11 @@ class IRequestHandler(Interface):
         """
         
     
+    def render_stream(tmpl_name, **kwargs):
+        """ Stream the template called ``tmpl_name`` as the response body.
+        """
+        
+    
     def redirect(url, status=302, content_type=None):
         """ Redirect to ``url``.
         """
@@ -332,6 +337,12 @@ class ITemplateRenderer(Interface):
         """
         
     
+    def render_iter(tmpl_name, **kwargs):
+        """ Render the template called ``tmpl_name`` as an iterator over
+          chunks of output.
+        """
+        
+    
     
 
 class IWSGIApplication(Interface):
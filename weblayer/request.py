@@ -49,6 +49,53 @@ class XSRFError(ValueError):
     """
     
 
+class LazyXSRFInput(object):
+    """ Stands in for a handler's ``xsrf_input`` in templates rendered by
+      :py:meth:`BaseHandler.render`, so that the ``_xsrf`` token, and the
+      cookie it's stored in, are only created if a template outputs it::
+      
+          >>> class Handler(object):
+          ...     calls = 0
+          ...     @property
+          ...     def xsrf_input(self):
+          ...         self.calls += 1
+          ...         return u'<input />'
+          ... 
+          >>> handler = Handler()
+          >>> xsrf_input = LazyXSRFInput(handler)
+          >>> handler.calls
+          0
+      
+      It's output as the ``<input />`` element, both by the default
+      ``unicode`` filter and by filters which honour ``__html__``, such as
+      ``h``::
+      
+          >>> unicode(xsrf_input), xsrf_input.__html__()
+          (u'<input />', u'<input />')
+          >>> handler.calls
+          2
+      
+      It isn't a string itself, so templates which use ``| n`` to turn
+      off filtering need to convert it first, e.g. with
+      ``${unicode(xsrf_input) | n}``.
+    """
+    
+    def __init__(self, handler):
+        self.handler = handler
+        
+    
+    def __unicode__(self):
+        return self.handler.xsrf_input
+        
+    
+    __html__ = __unicode__
+    
+    def __str__(self):
+        return self.__unicode__().encode('utf-8')
+        
+    
+
+
 class BaseHandler(object):
     """ A request handler (aka view class) implementation.
     """
@@ -216,21 +263,54 @@ class BaseHandler(object):
         
     
     
-    def render(self, tmpl_name, **kwargs):
-        """ Render the template called ``tmpl_name``, passing through the
-          ``params`` and ``kwargs``.
+    def _get_template_params(self, kwargs, xsrf_input):
+        """ Return the ``params`` passed to every template, updated with
+          ``kwargs``.
         """
         
         params = dict(
             request=self.request,
             current_user=self.auth.current_user,
             get_static_url=self.static.get_url,
-            xsrf_input=self.xsrf_input
+            xsrf_input=xsrf_input
         )
         params.update(kwargs)
+        return params
+        
+    
+    def render(self, tmpl_name, **kwargs):
+        """ Render the template called ``tmpl_name``, passing through the
+          ``params`` and ``kwargs``.
+          
+          ``xsrf_input`` is passed as a :py:class:`LazyXSRFInput`, so the
+          ``_xsrf`` token and cookie are only created if the template
+          outputs it.
+        """
+        
+        params = self._get_template_params(kwargs, LazyXSRFInput(self))
         return self.template_renderer.render(tmpl_name, **params)
         
     
+    def render_stream(self, tmpl_name, **kwargs):
+        """ Render the template called ``tmpl_name`` as per :py:meth:`render`
+          but use the chunks of output as the ``app_iter`` of 
+          ``self.response`` as the template produces them, rather than
+          building the whole body in memory first.  Returns the response.
+          
+          The template runs in a separate thread, so thread local values
+          aren't visible to it unless they're carried over by
+          ``mako.runtime.stream_thread_hooks``.
+          
+          ``xsrf_input`` is resolved before the template starts, so that
+          the ``_xsrf`` cookie is set before the response is.
+        """
+        
+        params = self._get_template_params(kwargs, self.xsrf_input)
+        chunks = self.template_renderer.render_iter(tmpl_name, **params)
+        self.response.app_iter = chunks
+        return self.response
+        
+    
     def redirect(self, location, permanent=False, **kwargs):
         """ Redirect to ``location``.  The response status defaults to ``302``
           unless ``permanent`` is ``True``.
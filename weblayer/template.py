@@ -30,6 +30,55 @@
       >>> template_renderer.render(tmpl_name, foo='&')
       '<h1>&amp;</h1>'
   
+  :py:meth:`~MakoTemplateRenderer.render_iter` renders the same output as an
+  iterator over encoded chunks, yielded as the template writes them::
+  
+      >>> ''.join(template_renderer.render_iter(tmpl_name, foo='&'))
+      '<h1>&amp;</h1>'
+  
+  Longer output is split into several chunks::
+  
+      >>> fd, stream_path = tempfile.mkstemp()
+      >>> stream_name = basename(stream_path)
+      >>> sock = os.fdopen(fd, 'w')
+      >>> sock.write("% for i in range(n):\\n${'x' * 5000}\\n% endfor\\n${1 / d}")
+      >>> sock.close()
+      >>> chunks = list(template_renderer.render_iter(stream_name, n=6, d=1))
+      >>> len(chunks) > 1
+      True
+      >>> ''.join(chunks) == template_renderer.render(stream_name, n=6, d=1)
+      True
+  
+  An error raised part way through the template is raised by the iterator,
+  once it has yielded the chunks written before it::
+  
+      >>> chunks = template_renderer.render_iter(stream_name, n=6, d=0)
+      >>> chunks.next()[:3]
+      'xxx'
+      >>> list(chunks)
+      Traceback (most recent call last):
+      ...
+      ZeroDivisionError: integer division or modulo by zero
+  
+  Closing the iterator early stops the render::
+  
+      >>> import threading
+      >>> threads = threading.activeCount()
+      >>> chunks = template_renderer.render_iter(stream_name, n=10000, d=1)
+      >>> chunks.next()[:3]
+      'xxx'
+      >>> chunks.close()
+      >>> threading.activeCount() == threads
+      True
+  
+  The built ins are passed to the template lookup as ``template_globals``,
+  so they're held in a layer of the template context that's shared between
+  renders, rather than being copied into each render's namespace.  Keyword
+  arguments take precedence over built ins of the same name::
+  
+      >>> template_renderer.render(tmpl_name, foo='&', escape=lambda s: s * 2)
+      '<h1>&&</h1>'
+  
   The built ins available by default are::
   
       DEFAULT_BUILT_INS = {
@@ -39,24 +88,81 @@
           "datetime": datetime
       }
   
+  Templates whose output depends only on their arguments can be marked as
+  pure, either with ``<%page cached_output="True"/>`` or by passing their
+  names to the renderer as ``pure_templates``.  If they declare their
+  arguments with ``<%page args="..."/>``, their encoded output is memoised,
+  keyed by the template's file, its output encoding and a hash of those
+  arguments.  Any other keyword arguments, such as the ``request`` a handler
+  passes to every template, are ignored::
+  
+      >>> fd, pure_path = tempfile.mkstemp()
+      >>> pure_name = basename(pure_path)
+      >>> sock = os.fdopen(fd, 'w')
+      >>> sock.write('<%page args="n" cached_output="True"/>${n * 2}')
+      >>> sock.close()
+      >>> template_renderer.render(pure_name, n=21, request=object())
+      '42'
+      >>> key = template_renderer.output_cache_key(pure_name, {'n': 21})
+      >>> template_renderer.output_cache[key][1]
+      '42'
+  
+  The output cache is shared by all renderers, as a renderer is created per
+  request.  It's a :py:class:`RenderedOutputCache`, bounded both by the
+  number of entries and by their total size in bytes.
+  
+  Each entry records the version of every template the output was rendered
+  from, including those it inherits from or includes, so it's discarded once
+  the lookup reloads any of them::
+  
+      >>> fd, layout_path = tempfile.mkstemp()
+      >>> layout_name = basename(layout_path)
+      >>> sock = os.fdopen(fd, 'w')
+      >>> sock.write('<b>${next.body(**context.kwargs)}</b>')
+      >>> sock.close()
+      >>> fd, page_path = tempfile.mkstemp()
+      >>> page_name = basename(page_path)
+      >>> sock = os.fdopen(fd, 'w')
+      >>> sock.write('<%%inherit file="%s"/>' % layout_name)
+      >>> sock.write('<%page args="n" cached_output="True"/>${n}')
+      >>> sock.close()
+      >>> template_renderer.render(page_name, n=1)
+      '<b>1</b>'
+      >>> sock = open(layout_path, 'w')
+      >>> sock.write('<i>${next.body(**context.kwargs)}</i>')
+      >>> sock.close()
+      >>> mtime = os.stat(layout_path).st_mtime + 5
+      >>> os.utime(layout_path, (mtime, mtime))
+      >>> template_renderer.render(page_name, n=1)
+      '<i>1</i>'
+  
   Cleanup::
   
       >>> os.unlink(abs_path)
+      >>> os.unlink(stream_path)
+      >>> os.unlink(pure_path)
+      >>> os.unlink(layout_path)
+      >>> os.unlink(page_path)
   
   .. _`Mako`: http://www.makotemplates.org/
 """
 
 __all__ = [
-    'MakoTemplateRenderer'
+    'MakoTemplateRenderer',
+    'RenderedOutputCache'
 ]
 
+import cPickle
 import datetime
+import hashlib
 import utils
 
 from zope.component import adapts
 from zope.interface import implements
 
+from mako import exceptions, runtime
 from mako.lookup import TemplateLookup
+from mako.util import LRUCache
 
 from interfaces import ISettings, ITemplateRenderer
 from settings import require_setting
@@ -70,6 +176,60 @@ DEFAULT_BUILT_INS = {
 
 require_setting('template_directories')
 
+class RenderedOutputCache(LRUCache):
+    """ A :py:class:`mako.util.LRUCache` of ``(versions, output)`` entries,
+      which is also bounded by the total length of the outputs it holds.
+      The least recently used entries are discarded to make room::
+      
+          >>> cache = RenderedOutputCache(10, max_bytes=10)
+          >>> cache['a'] = ((), 'aaaa')
+          >>> cache['b'] = ((), 'bbbb')
+          >>> cache['a'][1]
+          'aaaa'
+          >>> cache['c'] = ((), 'cccc')
+          >>> sorted(cache.keys()), cache.bytes
+          (['a', 'c'], 8)
+      
+      Outputs longer than ``max_bytes`` aren't stored::
+      
+          >>> cache['d'] = ((), 'd' * 11)
+          >>> 'd' in cache, cache.bytes
+          (False, 8)
+      
+    """
+    
+    def __init__(self, capacity, max_bytes, threshold=.5):
+        LRUCache.__init__(self, capacity, threshold)
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        
+    
+    def __setitem__(self, key, entry):
+        size = len(entry[1])
+        if size > self.max_bytes:
+            return
+        if key in self:
+            del self[key]
+        LRUCache.__setitem__(self, key, entry)
+        self.bytes += size
+        if self.bytes > self.max_bytes:
+            items = sorted(dict.values(self), key=lambda item: item.timestamp)
+            for item in items:
+                if self.bytes <= self.max_bytes:
+                    break
+                try:
+                    del self[item.key]
+                except KeyError:
+                    pass
+        
+    
+    def __delitem__(self, key):
+        item = dict.pop(self, key)
+        self.bytes -= len(item.value[1])
+        
+    
+
+
 class MakoTemplateRenderer(object):
     """ `Mako <http://www.makotemplates.org/>`_ template renderer.
     """
@@ -77,6 +237,8 @@ class MakoTemplateRenderer(object):
     adapts(ISettings)
     implements(ITemplateRenderer)
     
+    output_cache = RenderedOutputCache(1024, max_bytes=16 * 1024 * 1024)
+    
     def __init__(
             self, 
             settings,
@@ -86,6 +248,7 @@ class MakoTemplateRenderer(object):
             input_encoding='utf-8', 
             output_encoding='utf-8', 
             encoding_errors='replace',
+            pure_templates=None,
             **kwargs
         ):
         """
@@ -94,6 +257,7 @@ class MakoTemplateRenderer(object):
         directories = settings['template_directories']
         
         self.built_ins = built_ins is None and DEFAULT_BUILT_INS or built_ins
+        self.pure_templates = frozenset(pure_templates or ())
         
         if template_lookup_class is None:
             template_lookup_class = TemplateLookup
@@ -104,20 +268,98 @@ class MakoTemplateRenderer(object):
             input_encoding=input_encoding, 
             output_encoding=output_encoding, 
             encoding_errors=encoding_errors,
+            template_globals=self.built_ins,
             **kwargs
         )
         
     
     def render(self, tmpl_name, **kwargs):
-        """ Render ``tmpl_name``, unpacking ``self.built_ins`` and ``kwargs``
-          into the template's global namespace.
+        """ Render ``tmpl_name``, with ``self.built_ins`` and ``kwargs``
+          available in the template's global namespace.
+          
+          If the template is pure, the output is looked up in, or stored in,
+          ``self.output_cache``.
         """
         
-        params = self.built_ins.copy()
-        params.update(kwargs)
+        t = self.template_lookup.get_template(tmpl_name)
+        if not (t.cached_output or tmpl_name in self.pure_templates):
+            return t.render(**kwargs)
+        
+        key = self._output_cache_key(t, kwargs)
+        if key is None:
+            return t.render(**kwargs)
+        
+        try:
+            versions, output = self.output_cache[key]
+        except KeyError:
+            pass
+        else:
+            if self._is_current(t, versions):
+                return output
+        
+        output, dependencies = t.render_with_dependencies(**kwargs)
+        versions = [(t.uri, t.filename, t.last_modified)]
+        for dependency in dependencies:
+            version = (dependency.uri, dependency.filename, 
+                       dependency.last_modified)
+            if version not in versions:
+                versions.append(version)
+        self.output_cache[key] = (tuple(versions), output)
+        return output
+        
+    
+    def _is_current(self, t, versions):
+        """ Is each of the templates the cached output was rendered from
+          the one the lookup returns now?  This reloads any of them whose
+          source has changed, if the lookup checks for changes.
+        """
+        
+        if versions[0][2] != t.last_modified:
+            return False
+        for uri, filename, last_modified in versions[1:]:
+            try:
+                dependency = self.template_lookup.get_template(uri)
+            except exceptions.MakoException:
+                return False
+            if (dependency.filename, dependency.last_modified) != (
+                    filename, last_modified):
+                return False
+        return True
+        
+    
+    def output_cache_key(self, tmpl_name, kwargs):
+        """ Return the key ``tmpl_name``'s output is cached under when it's
+          rendered with ``kwargs``, or ``None`` if it doesn't declare any
+          ``<%page args>`` or the arguments can't be hashed.
+        """
+        
+        t = self.template_lookup.get_template(tmpl_name)
+        return self._output_cache_key(t, kwargs)
+        
+    
+    def _output_cache_key(self, t, kwargs):
+        argnames = runtime._argspec_for_callable(t.callable_)[1]
+        items = [(name, kwargs.get(name)) for name in argnames
+                 if name != 'pageargs']
+        if not items:
+            return None
+        try:
+            pickled = cPickle.dumps(items, 2)
+        except Exception:
+            return None
+        digest = hashlib.sha1(pickled).hexdigest()
+        filename = t.filename or t.uri
+        return (filename, t.output_encoding, t.encoding_errors, digest)
+        
+    
+    def render_iter(self, tmpl_name, **kwargs):
+        """ Render ``tmpl_name`` as per :py:meth:`render` but return an
+          iterator over chunks of the encoded output, which are yielded
+          as the template writes them.
+        """
         
         t = self.template_lookup.get_template(tmpl_name)
-        return t.render(**params)
+        return t.render_iter(**kwargs)
         
     
     
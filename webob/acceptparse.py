@@ -327,6 +327,67 @@ class MIMENilAccept(NilAccept):
     MasterClass = MIMEAccept
 
 
+class OfferSet(object):
+    """
+    A fixed sequence of offers, which can be matched against many
+    ``Accept-*`` headers.
+
+    The offers are checked once, when the set is created, and the best
+    match for each header value is remembered, so an application which
+    negotiates between the same offers on every request can create an
+    ``OfferSet`` once and use ``offers.best_match(req.accept)``.
+    """
+
+    cache_limit = 1000
+
+    def __init__(self, offers, default_match=None):
+        offers = tuple(offers)
+        for offer in offers:
+            if isinstance(offer, (tuple, list)):
+                offer = offer[0]
+            if '*' in offer:
+                raise ValueError("The application should offer specific types, got %r" % offer)
+        self.offers = offers
+        self.default_match = default_match
+        self._matches = {}
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.offers)
+
+    def best_match(self, accept):
+        """
+        Returns the best match among the offers for the given
+        ``Accept`` (or ``NilAccept``) object, as
+        ``accept.best_match(offers, default_match)`` would.
+        """
+        key = (accept.__class__, accept.header_name,
+               getattr(accept, 'header_value', None))
+        try:
+            return self._matches[key]
+        except KeyError:
+            pass
+        match = accept.best_match(self.offers, self.default_match)
+        if len(self._matches) >= self.cache_limit:
+            self._matches.clear()
+        self._matches[key] = match
+        return match
+
+# Parsed headers, which are shared as Accept objects aren't modified
+_accept_cache = {}
+_accept_cache_limit = 1000
+
+def _parsed_accept(AcceptClass, header_name, header_value):
+    key = (AcceptClass, header_name, header_value)
+    try:
+        return _accept_cache[key]
+    except KeyError:
+        pass
+    accept = AcceptClass(header_name, header_value)
+    if len(_accept_cache) >= _accept_cache_limit:
+        _accept_cache.clear()
+    _accept_cache[key] = accept
+    return accept
+
 
 def accept_property(header, rfc_section,
     AcceptClass=Accept, NilClass=NilAccept, convert_name='accept header'
@@ -339,7 +400,7 @@ def accept_property(header, rfc_section,
         value = req.environ.get(key)
         if not value:
             return NilClass(header)
-        return AcceptClass(header, value)
+        return _parsed_accept(AcceptClass, header, value)
     def fset(req, val):
         if val:
             if isinstance(val, (list, tuple, dict)):
@@ -4,7 +4,7 @@ class Range(object):
 
         This only represents ``bytes`` ranges, which are the only kind
         specified in HTTP.  This can represent multiple sets of ranges,
-        but no place else is this multi-range facility supported.
+        which are served with :meth:`ranges_for_length`.
     """
 
     def __init__(self, ranges): # expect non-inclusive
@@ -33,15 +33,23 @@ class Range(object):
         if length is None or len(self.ranges) != 1:
             return None
         start, end = self.ranges[0]
-        if end is None:
-            end = length
-            if start < 0:
-                start += length
-        if _is_content_range_valid(start, end, length):
-            stop = min(end, length)
-            return (start, stop)
-        else:
+        return _range_for_length(start, end, length)
+
+    def ranges_for_length(self, length):
+        """
+            Return a list of the (begin, end) non-inclusive ranges of
+            bytes to serve for a resource with the given byte length,
+            leaving out those ranges which it can't satisfy.  Returns
+            None if none of them can be satisfied.
+        """
+        if length is None:
             return None
+        result = []
+        for start, end in self.ranges:
+            range = _range_for_length(start, end, length)
+            if range is not None:
+                result.append(range)
+        return result or None
 
     def content_range(self, length):
         """
@@ -221,6 +229,17 @@ class ContentRange(object):
 
 
 
+def _range_for_length(start, end, length):
+    if end is None:
+        end = length
+        if start < 0:
+            start += length
+    if _is_content_range_valid(start, end, length):
+        stop = min(end, length)
+        return (start, stop)
+    else:
+        return None
+
 def _is_content_range_valid(start, stop, length, response=False):
     if (start is None) != (stop is None):
         return False
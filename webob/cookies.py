@@ -50,6 +50,11 @@ def serialize_max_age(v):
     else:
         return v
 
+# Serialized dates, by the naive datetime (to the second) or date they
+# were serialized from
+_cookie_dates = {}
+_cookie_dates_limit = 1000
+
 def serialize_cookie_date(v):
     if v is None:
         return None
@@ -59,10 +64,26 @@ def serialize_cookie_date(v):
         v = timedelta(seconds=v)
     if isinstance(v, timedelta):
         v = datetime.utcnow() + v
+    key = None
+    if isinstance(v, datetime):
+        if v.tzinfo is None:
+            key = v.replace(microsecond=0)
+    elif isinstance(v, date):
+        key = v
+    if key is not None:
+        try:
+            return _cookie_dates[key]
+        except KeyError:
+            pass
     if isinstance(v, (datetime, date)):
         v = v.timetuple()
     r = time.strftime('%%s, %d-%%s-%Y %H:%M:%S GMT', v)
-    return r % (weekdays[v[6]], months[v[1]])
+    r = r % (weekdays[v[6]], months[v[1]])
+    if key is not None:
+        if len(_cookie_dates) >= _cookie_dates_limit:
+            _cookie_dates.clear()
+        _cookie_dates[key] = r
+    return r
 
 class Morsel(dict):
     __slots__ = ('name', 'value')
@@ -144,6 +165,21 @@ _rx_cookie = re.compile(
 
 _rx_unquote = re.compile(r'\\([0-3][0-7][0-7]|.)')
 
+def parse_cookie_values(data):
+    """
+    Return a plain dictionary of the values of the cookies in a
+    ``Cookie`` request header, the same values ``Cookie(data)`` holds,
+    but without creating a :class:`Morsel` for each of them.
+    """
+    values = {}
+    for key, val in _rx_cookie.findall(data):
+        if key.lower() in _c_keys or key[0] == '$' or needs_quoting(key):
+            continue
+        if val[:1] == '"':
+            val = _unquote(val)
+        values[key] = val
+    return values
+
 def _unquote(v):
     if v and v[0] == v[-1] == '"':
         v = v[1:-1]
@@ -37,6 +37,31 @@ def environ_getter(key, default=_not_given, rfc_section=None):
             del req.environ[key]
     return property(fget, fset, fdel, doc=doc)
 
+def environ_cached(*keys):
+    """
+    Decorator which memoises a getter computed from the given environ
+    keys.  The value is stored in the environ, along with the values
+    of the keys it was computed from, so it's shared by every request
+    object for that environ; it's recomputed whenever one of the keys
+    has changed, whether through a setter or in the environ directly.
+    """
+    def decorate(func):
+        name = func.__name__.strip('_').replace('__get', '')
+        cache_key = 'webob._cached.' + name
+        def fget(req):
+            env = req.environ
+            inputs = tuple(map(env.get, keys))
+            cached = env.get(cache_key)
+            if cached is not None and cached[0] == inputs:
+                return cached[1]
+            value = func(req)
+            env[cache_key] = (inputs, value)
+            return value
+        fget.__name__ = func.__name__
+        fget.__doc__ = func.__doc__
+        return fget
+    return decorate
+
 
 def upath_property(key):
     def fget(req):
@@ -190,6 +190,9 @@ class IfRange(object):
         elif self.etag is not None:
             if not etag:
                 return False
+            if isinstance(self.etag, ETagMatcher):
+                # Ranges need a strong comparison, so weak etags don't match
+                return etag in self.etag.etags
             return etag in self.etag
         return True
 
@@ -182,6 +182,11 @@ def no_escape(value):
             value = str(value)
     return value
 
+# Responses rendered from the default templates, by everything that
+# goes into them; see WSGIHTTPException._cached_response
+_response_cache = {}
+_response_cache_limit = 1000
+
 def strip_tags(value):
     value = value.replace('\n', ' ')
     value = value.replace('\r', '')
@@ -309,12 +314,43 @@ ${body}''')
         return self.html_template_obj.substitute(status=self.status,
                                                  body=body)
 
+    def _response_cache_key(self, html):
+        # Bodies only depend on the environ through a custom template or
+        # an overridden method, and a Location header is made absolute
+        # using the environ, so those responses aren't cached
+        if self.body_template_obj is not WSGIHTTPException.body_template_obj:
+            return None
+        cls = self.__class__
+        for name in ('_make_body', 'plain_body', 'html_body'):
+            if getattr(cls, name).im_func is not \
+                    getattr(WSGIHTTPException, name).im_func:
+                return None
+        headerlist = tuple(self.headerlist)
+        for name, value in headerlist:
+            if name.lower() == 'location':
+                return None
+        if html:
+            template = self.html_template_obj
+        else:
+            template = self.plain_template_obj
+        return (template, self.status, self.title, self.explanation,
+                self.detail, self.comment, headerlist)
+
     def generate_response(self, environ, start_response):
         if self.content_length is not None:
             del self.content_length
-        headerlist = list(self.headerlist)
         accept = environ.get('HTTP_ACCEPT', '')
-        if accept and 'html' in accept or '*/*' in accept:
+        html = accept and 'html' in accept or '*/*' in accept
+        key = self._response_cache_key(html)
+        try:
+            status, headerlist, body = _response_cache[key]
+        except (KeyError, TypeError):
+            pass
+        else:
+            start_response(status, list(headerlist))
+            return [body]
+        headerlist = list(self.headerlist)
+        if html:
             content_type = 'text/html'
             body = self.html_body(environ)
         else:
@@ -330,6 +366,17 @@ ${body}''')
             **extra_kw
         )
         resp.content_type = content_type
+        if key is not None:
+            try:
+                hash(key)
+            except TypeError:
+                # The detail or comment isn't a string
+                pass
+            else:
+                if len(_response_cache) >= _response_cache_limit:
+                    _response_cache.clear()
+                _response_cache[key] = (
+                    resp.status, tuple(resp.headerlist), resp.body)
         return resp(environ, start_response)
 
     def __call__(self, environ, start_response):
@@ -7,6 +7,24 @@ class ResponseHeaders(MultiDict):
     """
         Dictionary view on the response headerlist.
         Keys are normalized for case and whitespace.
+
+        The list may be changed directly, and the view always sees the
+        current items:
+
+            >>> from webob import Response
+            >>> resp = Response('body')
+            >>> for i in range(10):
+            ...     resp.headers.add('X-H%d' % i, 'v%d' % i)
+            >>> resp.headers['x-h3']
+            'v3'
+            >>> hl = resp.headerlist
+            >>> hl.remove(('X-H2', 'v2'))
+            >>> hl.append(('X-Z', 'z'))
+            >>> resp.headers.get('X-Z'), resp.headers.get('X-H3')
+            ('z', 'v3')
+            >>> hl[hl.index(('X-H3', 'v3'))] = ('X-Y', 'y')
+            >>> resp.headers.get('X-Y'), resp.headers.get('X-H3')
+            ('y', None)
     """
     def __getitem__(self, key):
         key = key.lower()
@@ -101,21 +119,45 @@ key2header = {
 
 header2key = dict([(v.upper(),k) for (k,v) in key2header.items()])
 
+## Memoised translations between header names and environ keys, in
+## both directions; each is cleared if it ever grows past
+## _trans_cache_limit entries.
+_trans_keys = {}
+_trans_names = {}
+_trans_cache_limit = 1000
+
 def _trans_key(key):
+    try:
+        return _trans_keys[key]
+    except KeyError:
+        pass
     if not isinstance(key, basestring):
         return None
     elif key in key2header:
-        return key2header[key]
+        name = key2header[key]
     elif key.startswith('HTTP_'):
-        return key[5:].replace('_', '-').title()
+        name = key[5:].replace('_', '-').title()
     else:
-        return None
+        name = None
+    if len(_trans_keys) >= _trans_cache_limit:
+        _trans_keys.clear()
+    _trans_keys[key] = name
+    return name
 
 def _trans_name(name):
-    name = name.upper()
-    if name in header2key:
-        return header2key[name]
-    return 'HTTP_'+name.replace('-', '_')
+    try:
+        return _trans_names[name]
+    except KeyError:
+        pass
+    upper = name.upper()
+    if upper in header2key:
+        key = header2key[upper]
+    else:
+        key = 'HTTP_'+upper.replace('-', '_')
+    if len(_trans_names) >= _trans_cache_limit:
+        _trans_names.clear()
+    _trans_names[name] = key
+    return key
 
 class EnvironHeaders(DictMixin):
     """An object that represents the headers as present in a
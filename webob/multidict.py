@@ -19,8 +19,37 @@ class MultiDict(DictMixin):
         An ordered dictionary that can have multiple values for each key.
         Adds the methods getall, getone, mixed and extend and add to the normal
         dictionary interface.
+
+        Lookups go through an index of the positions of each key, which
+        the methods that change the items keep up to date:
+
+            >>> d = MultiDict([('a', 1), ('b', 2)])
+            >>> d['a']
+            1
+            >>> d.add('a', 3)
+            >>> d.extend([('c', 4), ('a', 5)])
+            >>> d.getall('a'), d['c']
+            ([1, 3, 5], 4)
+            >>> d.pop('a')
+            1
+            >>> d.getall('a'), d['b'], d['c']
+            ([3, 5], 2, 4)
+            >>> del d['b']
+            >>> 'b' in d, d['c'], d.items()
+            (False, 4, [('a', 3), ('c', 4), ('a', 5)])
+            >>> d['a'] = 6
+            >>> d.getall('a'), d.items()
+            ([6], [('c', 4), ('a', 6)])
     """
 
+    ## The positions of each key in self._items, built when a key is
+    ## first looked up and kept up to date by the methods which modify
+    ## the items (or set back to None, to be rebuilt, by those which
+    ## can't update it cheaply).  Views don't keep one, as the list
+    ## they're on may be changed directly at any time.
+    _index = None
+    _view = False
+
     def __init__(self, *args, **kw):
         if len(args) > 1:
             raise TypeError("MultiDict can only be called with one positional argument")
@@ -48,6 +77,7 @@ class MultiDict(DictMixin):
                 % (cls.__name__, lst))
         obj = cls()
         obj._items = lst
+        obj._view = True
         return obj
 
     @classmethod
@@ -64,34 +94,95 @@ class MultiDict(DictMixin):
                 obj.add(field.name, field.value)
         return obj
 
+    def _positions(self, key):
+        # The positions of key, or None
+        if self._view:
+            return [i for i, (k, v) in enumerate(self._items)
+                    if k == key] or None
+        index = self._index
+        if index is None:
+            index = self._build_index()
+        return index.get(key)
+
+    def _build_index(self):
+        index = self._index = {}
+        for i, (k, v) in enumerate(self._items):
+            if k in index:
+                index[k].append(i)
+            else:
+                index[k] = [i]
+        return index
+
+    def _index_appended(self, start=None):
+        # Called after one item, or the items from position start
+        # onwards, have been appended to self._items
+        items = self._items
+        index = self._index
+        if start is None:
+            start = len(items) - 1
+        for i in xrange(start, len(items)):
+            key = items[i][0]
+            if key in index:
+                index[key].append(i)
+            else:
+                index[key] = [i]
+
+    def _delete(self, key, positions):
+        # Delete the items at positions (in ascending order), which are
+        # all those of key or the first of them.  The positions of other
+        # keys are only unaffected if the items were all at the end.
+        items = self._items
+        length = len(items)
+        for i in reversed(positions):
+            del items[i]
+        index = self._index
+        if index is None:
+            return
+        count = len(positions)
+        if (positions[0] + count != length
+                or index.get(key, [])[-count:] != positions):
+            self._index = None
+            return
+        del index[key][-count:]
+        if not index[key]:
+            del index[key]
+
     def __getitem__(self, key):
-        for k, v in reversed(self._items):
-            if k == key:
-                return v
+        positions = self._positions(key)
+        if positions:
+            return self._items[positions[-1]][1]
         raise KeyError(key)
 
     def __setitem__(self, key, value):
-        try:
-            del self[key]
-        except KeyError:
-            pass
-        self._items.append((key, value))
+        items = self._items
+        positions = self._positions(key)
+        if positions:
+            if positions == [len(items) - 1]:
+                # The only value is the last, so it can just be replaced
+                items[-1] = (key, value)
+                return
+            self._delete(key, list(positions))
+        items.append((key, value))
+        if self._index is not None:
+            self._index_appended()
 
     def add(self, key, value):
         """
         Add the key and value, not overwriting any previous value.
         """
         self._items.append((key, value))
+        if self._index is not None:
+            self._index_appended()
 
     def getall(self, key):
         """
         Return a list of all values matching the key (may be an empty list)
         """
-        result = []
-        for k, v in self._items:
-            if key == k:
-                result.append(v)
-        return result
+        positions = self._positions(key)
+        if not positions:
+            return []
+        items = self._items
+        return [items[i][1] for i in positions]
 
     def getone(self, key):
         """
@@ -138,54 +229,54 @@ class MultiDict(DictMixin):
         return r
 
     def __delitem__(self, key):
-        items = self._items
-        found = False
-        for i in range(len(items)-1, -1, -1):
-            if items[i][0] == key:
-                del items[i]
-                found = True
-        if not found:
+        positions = self._positions(key)
+        if not positions:
             raise KeyError(key)
+        self._delete(key, list(positions))
 
     def __contains__(self, key):
-        for k, v in self._items:
-            if k == key:
-                return True
-        return False
+        return bool(self._positions(key))
 
     has_key = __contains__
 
     def clear(self):
         self._items = []
+        self._index = None
 
     def copy(self):
         return self.__class__(self)
 
     def setdefault(self, key, default=None):
-        for k, v in self._items:
-            if key == k:
-                return v
+        positions = self._positions(key)
+        if positions:
+            return self._items[positions[0]][1]
         self._items.append((key, default))
+        if self._index is not None:
+            self._index_appended()
         return default
 
     def pop(self, key, *args):
         if len(args) > 1:
             raise TypeError, "pop expected at most 2 arguments, got "\
                               + repr(1 + len(args))
-        for i in range(len(self._items)):
-            if self._items[i][0] == key:
-                v = self._items[i][1]
-                del self._items[i]
-                return v
+        positions = self._positions(key)
+        if positions:
+            i = positions[0]
+            v = self._items[i][1]
+            self._delete(key, [i])
+            return v
         if args:
             return args[0]
         else:
             raise KeyError(key)
 
     def popitem(self):
-        return self._items.pop()
+        item = self._items[-1]
+        self._delete(item[0], [len(self._items) - 1])
+        return item
 
     def extend(self, other=None, **kwargs):
+        start = len(self._items)
         if other is None:
             pass
         elif hasattr(other, 'items'):
@@ -196,6 +287,8 @@ class MultiDict(DictMixin):
         else:
             for k, v in other:
                 self._items.append((k, v))
+        if self._index is not None:
+            self._index_appended(start)
         if kwargs:
             self.update(kwargs)
 
@@ -248,6 +341,10 @@ class UnicodeMultiDict(DictMixin):
     variable is decoded. Its ``name`` variable is decoded when ``decode_keys``
     is enabled.
 
+    Decoded values are memoised, so a value which is read repeatedly is
+    only decoded once; ``encoding``, ``errors`` and ``decode_keys``
+    shouldn't be changed once values have been read.
+
     """
     def __init__(self, multi=None, encoding=None, errors='strict',
                  decode_keys=False):
@@ -257,6 +354,7 @@ class UnicodeMultiDict(DictMixin):
         self.encoding = encoding
         self.errors = errors
         self.decode_keys = decode_keys
+        self._decoded = {}
 
     def _decode_key(self, key):
         if self.decode_keys:
@@ -278,6 +376,14 @@ class UnicodeMultiDict(DictMixin):
 
         ``FieldStorage`` objects are specially handled.
         """
+        if isinstance(value, unicode):
+            return value
+        decoded = self._decoded
+        try:
+            return decoded[value]
+        except (KeyError, TypeError):
+            pass
+        orig = value
         if isinstance(value, cgi.FieldStorage):
             # decode FieldStorage's field name and filename
             value = copy.copy(value)
@@ -288,11 +394,15 @@ class UnicodeMultiDict(DictMixin):
                 if not isinstance(value.filename, unicode):
                     value.filename = value.filename.decode(self.encoding,
                                                            self.errors)
-        elif not isinstance(value, unicode):
+        else:
             try:
                 value = value.decode(self.encoding, self.errors)
             except AttributeError:
                 pass
+        try:
+            decoded[orig] = value
+        except TypeError:
+            pass
         return value
 
     def _encode_value(self, value):
@@ -413,7 +523,6 @@ class UnicodeMultiDict(DictMixin):
         for v in self.multi.itervalues():
             yield self._decode_value(v)
 
-_dummy = object()
 
 class TrackableMultiDict(MultiDict):
     tracker = None
@@ -468,9 +577,8 @@ class NestedMultiDict(MultiDict):
 
     def __getitem__(self, key):
         for d in self.dicts:
-            value = d.get(key, _dummy)
-            if value is not _dummy:
-                return value
+            if key in d:
+                return d[key]
         raise KeyError(key)
 
     def _readonly(self, *args, **kw):
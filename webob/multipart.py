@@ -0,0 +1,360 @@
+"""
+Streaming parser for ``multipart/form-data`` request bodies.
+
+The body is read in fixed-size blocks rather than line by line, file
+uploads are spooled to temporary files once they grow past a threshold,
+and limits can be set on the size of ordinary fields, the number of
+parts and the size of the whole body.
+"""
+import cgi
+import mimetools
+import tempfile
+from cStringIO import StringIO
+
+from webob.multidict import MultiDict
+
+__all__ = ['parse_multipart', 'MultipartPart', 'MultipartError',
+           'MultipartLimitError']
+
+BLOCK_SIZE = 64*1024
+MAX_HEADER_SIZE = 16*1024
+
+class MultipartError(ValueError):
+    """
+    Raised when a multipart body is malformed.
+    """
+
+class MultipartLimitError(MultipartError):
+    """
+    Raised when a multipart body exceeds one of the limits it's parsed
+    with.
+    """
+
+class MultipartPart(cgi.FieldStorage):
+    """
+    A file uploaded in a multipart body.
+
+    This is a ``cgi.FieldStorage`` with the same attributes as those
+    ``cgi.FieldStorage`` creates for the parts of a form (``name``,
+    ``filename``, ``type``, ``type_options``, ``headers``, ``file`` and
+    ``value``), but it's built by :func:`parse_multipart` rather than
+    parsing anything itself.
+    """
+
+    def __init__(self, headers, name, filename, file, length):
+        self.fp = None
+        self.headers = headers
+        self.outerboundary = self.innerboundary = ''
+        self.keep_blank_values = 1
+        self.strict_parsing = 0
+        self.qs_on_post = None
+        self.disposition, self.disposition_options = cgi.parse_header(
+            headers.get('content-disposition', ''))
+        self.name = name
+        self.filename = filename
+        if 'content-type' in headers:
+            self.type, self.type_options = cgi.parse_header(
+                headers['content-type'])
+        else:
+            self.type, self.type_options = 'text/plain', {}
+        self.list = None
+        self.file = file
+        self.length = length
+        self.done = 1
+
+def _read_blocks(fp, length, max_body, block_size):
+    if length is not None and length < 0:
+        length = None
+    if max_body is not None and length is not None and length > max_body:
+        raise MultipartLimitError(
+            'Request body of %s bytes exceeds the limit of %s bytes'
+            % (length, max_body))
+    total = 0
+    while length is None or total < length:
+        size = block_size
+        if length is not None:
+            size = min(size, length - total)
+        block = fp.read(size)
+        if not block:
+            break
+        total += len(block)
+        if max_body is not None and total > max_body:
+            raise MultipartLimitError(
+                'Request body exceeds the limit of %s bytes' % max_body)
+        yield block
+
+class _Spool(object):
+    """
+    Collects the content of a file part, in memory until it grows past
+    ``limit`` bytes and in a temporary file after that.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.file = StringIO()
+        self.size = 0
+        self.on_disk = False
+
+    def write(self, data):
+        self.size += len(data)
+        if not self.on_disk and self.size > self.limit:
+            fileobj = tempfile.TemporaryFile()
+            fileobj.write(self.file.getvalue())
+            self.file = fileobj
+            self.on_disk = True
+        self.file.write(data)
+
+    def finish(self):
+        self.file.seek(0)
+        return self.file
+
+class _Field(object):
+    """
+    Collects the value of an ordinary field, which is kept in memory.
+    """
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if self.limit is not None and self.size > self.limit:
+            raise MultipartLimitError(
+                'Field %r exceeds the limit of %s bytes'
+                % (self.name, self.limit))
+        self.chunks.append(data)
+
+    def finish(self):
+        return ''.join(self.chunks)
+
+def parse_multipart(fp, content_type, content_length=None,
+                    spool_limit=64*1024, max_field_size=None,
+                    max_parts=None, max_body=None, block_size=BLOCK_SIZE):
+    """
+    Parse the ``multipart/form-data`` body read from ``fp`` and return a
+    :class:`MultiDict` of its fields.
+
+    Ordinary fields are added as strings, and file uploads as
+    :class:`MultipartPart` objects, the same as
+    ``MultiDict.from_fieldstorage`` returns for a ``cgi.FieldStorage``.
+
+    At most ``content_length`` bytes are read, if it's given; otherwise
+    the body is read up to its closing boundary.  Uploads larger than
+    ``spool_limit`` bytes are written to temporary files.  A
+    :class:`MultipartLimitError` is raised if an ordinary field is larger
+    than ``max_field_size``, if there are more than ``max_parts`` parts or
+    if the body is larger than ``max_body`` bytes; a limit of ``None``
+    isn't enforced.
+
+    The fields are the same as ``cgi.FieldStorage`` finds, whether the
+    body uses CRLF or bare LF line breaks::
+
+        >>> import cgi
+        >>> def body(newline):
+        ...     return newline.join([
+        ...         '--xyz',
+        ...         'Content-Disposition: form-data; name="a"',
+        ...         '',
+        ...         'one',
+        ...         '--xyz',
+        ...         'Content-Disposition: form-data; name="a"',
+        ...         '',
+        ...         'two' + newline + 'lines',
+        ...         '--xyz',
+        ...         'Content-Disposition: form-data; name="f"; filename="f.txt"',
+        ...         'Content-Type: text/plain',
+        ...         '',
+        ...         'file content',
+        ...         '--xyz--',
+        ...         ''])
+        >>> def fieldstorage(data):
+        ...     environ = {'REQUEST_METHOD': 'POST',
+        ...                'CONTENT_TYPE': 'multipart/form-data; boundary=xyz',
+        ...                'CONTENT_LENGTH': str(len(data))}
+        ...     fs = cgi.FieldStorage(StringIO(data), environ=environ,
+        ...                           keep_blank_values=True)
+        ...     return MultiDict.from_fieldstorage(fs)
+        >>> def simple(vars):
+        ...     return [(k, getattr(v, 'filename', None),
+        ...              getattr(v, 'value', v)) for k, v in vars.items()]
+        >>> for newline in '\\r\\n', '\\n':
+        ...     data = body(newline)
+        ...     vars = parse_multipart(StringIO(data),
+        ...                            'multipart/form-data; boundary=xyz',
+        ...                            len(data))
+        ...     print simple(vars) == simple(fieldstorage(data))
+        True
+        True
+        >>> simple(vars)
+        [('a', None, 'one'), ('a', None, 'two\\nlines'), ('f', 'f.txt', 'file content')]
+
+    An upload stays in memory up to ``spool_limit`` bytes, and is written
+    to a temporary file beyond it::
+
+        >>> upload = parse_multipart(StringIO(data),
+        ...                          'multipart/form-data; boundary=xyz',
+        ...                          spool_limit=100)['f']
+        >>> isinstance(upload.file, file), upload.value
+        (False, 'file content')
+        >>> upload = parse_multipart(StringIO(data),
+        ...                          'multipart/form-data; boundary=xyz',
+        ...                          spool_limit=5)['f']
+        >>> isinstance(upload.file, file), upload.value
+        (True, 'file content')
+
+    Each of the limits is enforced::
+
+        >>> parse_multipart(StringIO(data), 'multipart/form-data; boundary=xyz',
+        ...                 max_field_size=5)
+        Traceback (most recent call last):
+            ...
+        MultipartLimitError: Field 'a' exceeds the limit of 5 bytes
+        >>> parse_multipart(StringIO(data), 'multipart/form-data; boundary=xyz',
+        ...                 max_parts=2)
+        Traceback (most recent call last):
+            ...
+        MultipartLimitError: Multipart body has more than 2 parts
+        >>> parse_multipart(StringIO(data), 'multipart/form-data; boundary=xyz',
+        ...                 max_body=100, block_size=10)
+        Traceback (most recent call last):
+            ...
+        MultipartLimitError: Request body exceeds the limit of 100 bytes
+        >>> parse_multipart(StringIO(data), 'multipart/form-data; boundary=xyz',
+        ...                 len(data), max_body=100)
+        Traceback (most recent call last):
+            ...
+        MultipartLimitError: Request body of 222 bytes exceeds the limit of 100 bytes
+
+    When the body of a request is parsed, exceeding a limit is an
+    ``HTTPRequestEntityTooLarge`` error::
+
+        >>> from webob import Request
+        >>> req = Request.blank('/', method='POST',
+        ...                     content_type='multipart/form-data; boundary=xyz',
+        ...                     body=data)
+        >>> req.multipart_max_parts = 2
+        >>> req.POST
+        Traceback (most recent call last):
+            ...
+        HTTPRequestEntityTooLarge: Multipart body has more than 2 parts
+    """
+    ctype, options = cgi.parse_header(content_type)
+    boundary = options.get('boundary')
+    if not boundary:
+        raise MultipartError(
+            'Content-Type %r does not contain a boundary' % content_type)
+    if not cgi.valid_boundary(boundary):
+        raise MultipartError('Invalid boundary in multipart body: %r'
+                             % boundary)
+    # The body is prefixed by a line break so that the first boundary,
+    # which usually has nothing before it, is found at the start of a
+    # line like the others.
+    first = '\n--' + boundary
+    blocks = _read_blocks(fp, content_length, max_body, block_size)
+    vars = MultiDict()
+    parts = 0
+    buf = '\n'
+    pos = 0
+    eof = False
+
+    # Skip the preamble, up to the first boundary and the two characters
+    # after it, which show which line break the body uses
+    while True:
+        found = buf.find(first, pos)
+        if found != -1 and (eof or len(buf) >= found + len(first) + 2):
+            pos = found + len(first)
+            break
+        if eof:
+            if buf.strip():
+                raise MultipartError('Multipart body has no boundary')
+            return vars
+        if found == -1:
+            pos = max(0, len(buf) - len(first) + 1)
+        else:
+            pos = found
+        for block in blocks:
+            buf = buf[pos:] + block
+            pos = 0
+            break
+        else:
+            eof = True
+
+    # Most clients use CRLF, but bare LF line breaks are accepted too, as
+    # cgi.FieldStorage accepts them.  The delimiter includes the line
+    # break which precedes it, as that belongs to the delimiter rather
+    # than to the content of the part.
+    if buf[pos:pos+2] == '\r\n':
+        newline = '\r\n'
+    else:
+        newline = '\n'
+    delimiter = newline + '--' + boundary
+    header_end = newline + newline
+    keep = len(delimiter) - 1
+
+    while True:
+        # After a delimiter comes either "--", which ends the body, or
+        # the line break which ends the boundary line, followed by the
+        # headers of the next part.
+        while True:
+            end = buf.find(header_end, pos)
+            if end != -1 or (len(buf) - pos >= 2 and buf[pos:pos+2] == '--'):
+                break
+            if len(buf) - pos > MAX_HEADER_SIZE:
+                raise MultipartLimitError(
+                    'Multipart headers exceed %s bytes' % MAX_HEADER_SIZE)
+            for block in blocks:
+                buf = buf[pos:] + block
+                pos = 0
+                break
+            else:
+                if buf[pos:pos+2] == '--':
+                    break
+                raise MultipartError('Unexpected end of multipart body')
+        if buf[pos:pos+2] == '--':
+            break
+
+        if end - pos > MAX_HEADER_SIZE:
+            raise MultipartLimitError(
+                'Multipart headers exceed %s bytes' % MAX_HEADER_SIZE)
+        parts += 1
+        if max_parts is not None and parts > max_parts:
+            raise MultipartLimitError(
+                'Multipart body has more than %s parts' % max_parts)
+        header_start = buf.find(newline, pos) + len(newline)
+        headers = mimetools.Message(
+            StringIO(buf[header_start:end+len(newline)]), 0)
+        pos = end + len(header_end)
+        disposition, disposition_options = cgi.parse_header(
+            headers.get('content-disposition', ''))
+        name = disposition_options.get('name')
+        filename = disposition_options.get('filename')
+        if filename:
+            sink = _Spool(spool_limit)
+        else:
+            sink = _Field(name, max_field_size)
+
+        while True:
+            found = buf.find(delimiter, pos)
+            if found != -1:
+                sink.write(buf[pos:found])
+                pos = found + len(delimiter)
+                break
+            safe = max(pos, len(buf) - keep)
+            sink.write(buf[pos:safe])
+            pos = safe
+            for block in blocks:
+                buf = buf[pos:] + block
+                pos = 0
+                break
+            else:
+                raise MultipartError('Unexpected end of multipart body')
+
+        if filename:
+            vars.add(name, MultipartPart(
+                headers, name, filename, sink.finish(), sink.size))
+        else:
+            vars.add(name, sink.finish())
+    return vars
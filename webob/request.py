@@ -8,12 +8,13 @@ else:
 from webob.headers import EnvironHeaders
 from webob.acceptparse import accept_property, Accept, MIMEAccept, NilAccept, MIMENilAccept, NoAccept
 from webob.multidict import TrackableMultiDict, MultiDict, UnicodeMultiDict, NestedMultiDict, NoVars
+from webob.multipart import parse_multipart, MultipartLimitError
 from webob.cachecontrol import CacheControl, serialize_cache_control
 from webob.etag import etag_property, AnyETag, NoETag
 
 from webob.descriptors import *
 from webob.datetime_utils import *
-from webob.cookies import Cookie
+from webob.cookies import parse_cookie_values
 
 __all__ = ['BaseRequest', 'Request']
 
@@ -27,6 +28,9 @@ class _NoDefault:
         return '(No Default)'
 NoDefault = _NoDefault()
 
+# NoVars is read-only, so every non-form request can share one
+_not_form_vars = NoVars('Not a form request')
+
 
 class BaseRequest(object):
     ## Options:
@@ -36,6 +40,15 @@ class BaseRequest(object):
     ## if they are read in (under this, and the request body is stored
     ## in memory):
     request_body_tempfile_limit = 10*1024
+    ## Limits applied when parsing multipart/form-data bodies: file
+    ## uploads larger than the spool limit are stored on disk, and a
+    ## webob.exc.HTTPRequestEntityTooLarge is raised when one of the
+    ## others is exceeded (None means no limit).  Only the size of the
+    ## whole body is limited by default, and generously:
+    multipart_spool_limit = 64*1024
+    multipart_max_field_size = None
+    multipart_max_parts = None
+    multipart_max_body = 1024*1024*1024
 
     def __init__(self, environ=None, environ_getter=None, charset=NoDefault, unicode_errors=NoDefault,
                  decode_param_names=NoDefault, **kw):
@@ -201,6 +214,7 @@ class BaseRequest(object):
     headers = property(_headers__get, _headers__set, doc=_headers__get.__doc__)
 
     @property
+    @environ_cached('wsgi.url_scheme', 'HTTP_HOST', 'SERVER_NAME', 'SERVER_PORT')
     def host_url(self):
         """
         The URL through the host (no path)
@@ -229,6 +243,8 @@ class BaseRequest(object):
         return url
 
     @property
+    @environ_cached('wsgi.url_scheme', 'HTTP_HOST', 'SERVER_NAME', 'SERVER_PORT',
+                    'SCRIPT_NAME')
     def application_url(self):
         """
         The URL including SCRIPT_NAME (no PATH_INFO or query string)
@@ -236,6 +252,8 @@ class BaseRequest(object):
         return self.host_url + urllib.quote(self.environ.get('SCRIPT_NAME', ''))
 
     @property
+    @environ_cached('wsgi.url_scheme', 'HTTP_HOST', 'SERVER_NAME', 'SERVER_PORT',
+                    'SCRIPT_NAME', 'PATH_INFO')
     def path_url(self):
         """
         The URL including SCRIPT_NAME and PATH_INFO, but not QUERY_STRING
@@ -243,6 +261,7 @@ class BaseRequest(object):
         return self.application_url + urllib.quote(self.environ.get('PATH_INFO', ''))
 
     @property
+    @environ_cached('SCRIPT_NAME', 'PATH_INFO')
     def path(self):
         """
         The path of the request, without host or query string
@@ -261,6 +280,8 @@ class BaseRequest(object):
         return path
 
     @property
+    @environ_cached('wsgi.url_scheme', 'HTTP_HOST', 'SERVER_NAME', 'SERVER_PORT',
+                    'SCRIPT_NAME', 'PATH_INFO', 'QUERY_STRING')
     def url(self):
         """
         The full request URL, including QUERY_STRING
@@ -478,7 +499,7 @@ class BaseRequest(object):
         """
         env = self.environ
         if self.method not in ('POST', 'PUT'):
-            return NoVars('Not a form request')
+            return _not_form_vars
         if 'webob._parsed_post_vars' in env:
             vars, body_file = env['webob._parsed_post_vars']
             if body_file is self.body_file:
@@ -499,6 +520,20 @@ class BaseRequest(object):
             # Not an HTML form submission
             return NoVars('Not an HTML form submission (Content-Type: %s)'
                           % content_type)
+        if content_type == 'multipart/form-data':
+            try:
+                vars = parse_multipart(
+                    self.body_file, env['CONTENT_TYPE'], self.content_length,
+                    spool_limit=self.multipart_spool_limit,
+                    max_field_size=self.multipart_max_field_size,
+                    max_parts=self.multipart_max_parts,
+                    max_body=self.multipart_max_body)
+            except MultipartLimitError, e:
+                from webob.exc import HTTPRequestEntityTooLarge
+                raise HTTPRequestEntityTooLarge(detail=str(e))
+            FakeCGIBody.update_environ(env, vars)
+            env['webob._parsed_post_vars'] = (vars, self.body_file)
+            return vars
         fs_environ = env.copy()
         # FieldStorage assumes a default CONTENT_LENGTH of -1, but a
         # default of 0 is better:
@@ -519,11 +554,7 @@ class BaseRequest(object):
         """
         Like ``.str_POST``, but may decode values and keys
         """
-        vars = self.str_POST
-        vars = UnicodeMultiDict(vars, encoding=self.charset,
-                                errors=self.unicode_errors,
-                                decode_keys=self.decode_param_names)
-        return vars
+        return self._decoded_vars('webob._decoded_post_vars', self.str_POST)
 
 
 
@@ -560,11 +591,21 @@ class BaseRequest(object):
         """
         Like ``.str_GET``, but may decode values and keys
         """
-        vars = self.str_GET
-        vars = UnicodeMultiDict(vars, encoding=self.charset,
-                                errors=self.unicode_errors,
-                                decode_keys=self.decode_param_names)
-        return vars
+        return self._decoded_vars('webob._decoded_query_vars', self.str_GET)
+
+    def _decoded_vars(self, cache_key, vars):
+        # The decoded view is kept in the environ for as long as the
+        # parsed vars it wraps and the decoding arguments are the same
+        env = self.environ
+        args = (self.charset, self.unicode_errors, self.decode_param_names)
+        if cache_key in env:
+            decoded, parsed, parsed_args = env[cache_key]
+            if parsed is vars and parsed_args == args:
+                return decoded
+        decoded = UnicodeMultiDict(vars, encoding=args[0], errors=args[1],
+                                   decode_keys=args[2])
+        env[cache_key] = (decoded, vars, args)
+        return decoded
 
 
     str_postvars = deprecated_property(str_POST, 'str_postvars', 'use str_POST instead')
@@ -579,7 +620,15 @@ class BaseRequest(object):
         A dictionary-like object containing both the parameters from
         the query string and request body.
         """
-        return NestedMultiDict(self.str_GET, self.str_POST)
+        env = self.environ
+        get, post = self.str_GET, self.str_POST
+        if 'webob._parsed_params' in env:
+            vars, parsed_get, parsed_post = env['webob._parsed_params']
+            if parsed_get is get and parsed_post is post:
+                return vars
+        vars = NestedMultiDict(get, post)
+        env['webob._parsed_params'] = (vars, get, post)
+        return vars
 
 
     @property
@@ -587,11 +636,7 @@ class BaseRequest(object):
         """
         Like ``.str_params``, but may decode values and keys
         """
-        params = self.str_params
-        params = UnicodeMultiDict(params, encoding=self.charset,
-                                  errors=self.unicode_errors,
-                                  decode_keys=self.decode_param_names)
-        return params
+        return self._decoded_vars('webob._decoded_params', self.str_params)
 
 
     @property
@@ -605,14 +650,10 @@ class BaseRequest(object):
             vars, var_source = env['webob._parsed_cookies']
             if var_source == source:
                 return vars
-        vars = {}
         if source:
-            cookies = Cookie(source)
-            for name in cookies:
-                value = cookies[name].value
-                if value is None:
-                    continue
-                vars[name] = value
+            vars = parse_cookie_values(source)
+        else:
+            vars = {}
         env['webob._parsed_cookies'] = (vars, source)
         return vars
 
@@ -621,11 +662,7 @@ class BaseRequest(object):
         """
         Like ``.str_cookies``, but may decode values and keys
         """
-        vars = self.str_cookies
-        vars = UnicodeMultiDict(vars, encoding=self.charset,
-                                errors=self.unicode_errors,
-                                decode_keys=self.decode_param_names)
-        return vars
+        return self._decoded_vars('webob._decoded_cookies', self.str_cookies)
 
 
     def copy(self):
@@ -1,4 +1,4 @@
-import sys, re, urlparse, zlib, struct
+import sys, re, urlparse, zlib, struct, random
 from datetime import datetime, date, timedelta
 
 from webob.headers import ResponseHeaders
@@ -932,7 +932,14 @@ class Response(object):
 
         * If-Modified-Since   (304 Not Modified; only on GET, HEAD)
         * If-None-Match       (304 Not Modified; only on GET, HEAD)
-        * Range               (406 Partial Content; only on GET, HEAD)
+        * Range               (206 Partial Content; only on GET)
+        * If-Range            (the whole body unless it matches; with Range)
+
+        A Range header with several ranges is answered with a
+        ``multipart/byteranges`` body, provided the app_iter can be
+        read more than once: a body, a list or an app_iter with an
+        ``app_iter_range`` method, like :class:`FileIter`.  Otherwise
+        the whole body is served.
         """
         req = self.RequestClass(environ)
         status304 = False
@@ -965,9 +972,8 @@ class Response(object):
             and self.status_int == 200
             and self.content_length is not None
         ):
-            content_range = req.range.content_range(self.content_length)
-            # FIXME: we should support If-Range
-            if content_range is None:
+            ranges = req.range.ranges_for_length(self.content_length)
+            if ranges is None:
                 iter_close(self.app_iter)
                 # FIXME: we should use exc.HTTPRequestRangeNotSatisfiable
                 # and let it generate the response body in correct content-type
@@ -980,7 +986,9 @@ class Response(object):
                 error_resp.content_type = 'text/plain'
                 #error_resp.content_length = None
                 return error_resp(environ, start_response)
-            else:
+            elif len(ranges) == 1:
+                content_range = ContentRange(ranges[0][0], ranges[0][1],
+                                             self.content_length)
                 app_iter = self.app_iter_range(content_range.start, content_range.stop)
                 if app_iter is not None:
                     partial_resp = Response(
@@ -993,9 +1001,49 @@ class Response(object):
                     assert content_range.start is not None
                     partial_resp.content_length = content_range.stop - content_range.start
                     return partial_resp(environ, start_response)
+            elif self._app_iter_rereadable():
+                return self._multi_range_response(
+                    ranges, headerlist)(environ, start_response)
         start_response(self.status, headerlist)
         return self.app_iter
 
+    def _app_iter_rereadable(self):
+        app_iter = self._app_iter
+        return (app_iter is None or isinstance(app_iter, (list, tuple))
+                or hasattr(app_iter, 'app_iter_range'))
+
+    def _multi_range_response(self, ranges, headerlist):
+        """
+        Return a ``206 Partial Content`` response whose
+        ``multipart/byteranges`` body holds the given ranges.
+        """
+        boundary = '%032x' % random.getrandbits(128)
+        part_head = '\r\n--%s\r\n' % boundary
+        content_type = self.headers.get('Content-Type')
+        if content_type:
+            part_head += 'Content-Type: %s\r\n' % content_type
+        parts = []
+        length = 0
+        for start, stop in ranges:
+            head = part_head + 'Content-Range: %s\r\n\r\n' % ContentRange(
+                start, stop, self.content_length)
+            if not parts:
+                # There's no line break before the first boundary
+                head = head[2:]
+            parts.append((head, start, stop))
+            length += len(head) + stop - start
+        tail = '\r\n--%s--\r\n' % boundary
+        partial_resp = Response(
+            status='206 Partial Content',
+            headers=list(headerlist),
+            app_iter=AppIterMultiRange(self.app_iter, self.app_iter_range,
+                                       parts, tail),
+        )
+        partial_resp.headers['Content-Type'] = (
+            'multipart/byteranges; boundary=%s' % boundary)
+        partial_resp.content_length = length + len(tail)
+        return partial_resp
+
     def app_iter_range(self, start, stop):
         """
         Return a new app_iter built from the response app_iter, that
@@ -1113,6 +1161,76 @@ class AppIterRange(object):
         iter_close(self.app_iter)
 
 
+class AppIterMultiRange(object):
+    """
+    Serves several ranges of a response body as the parts of a
+    ``multipart/byteranges`` body.
+
+    ``parts`` is a list of ``(head, start, stop)``, where ``head`` is
+    the boundary and headers of the part, and each range is read with
+    ``app_iter_range(start, stop)`` once the previous one is done.
+    """
+
+    def __init__(self, app_iter, app_iter_range, parts, tail):
+        self.app_iter = app_iter
+        self.app_iter_range = app_iter_range
+        self.parts = parts
+        self.tail = tail
+
+    def __iter__(self):
+        for head, start, stop in self.parts:
+            yield head
+            for chunk in self.app_iter_range(start, stop):
+                yield chunk
+        yield self.tail
+
+    def close(self):
+        iter_close(self.app_iter)
+
+
+class FileIter(object):
+    """
+    An app_iter which reads a file in blocks of ``block_size`` bytes.
+
+    Ranges of the file are served by seeking to their start rather
+    than by reading and discarding everything before it, so a range at
+    the end of a large file is as cheap to serve as one at the start.
+    The file is closed when the app_iter is.
+    """
+
+    def __init__(self, file, block_size=64*1024, start=None, stop=None):
+        self.file = file
+        self.block_size = block_size
+        self.start = start
+        self.stop = stop
+
+    def __iter__(self):
+        file, block_size, remaining = self.file, self.block_size, None
+        if self.start is not None:
+            file.seek(self.start)
+            if self.stop is not None:
+                remaining = self.stop - self.start
+        while remaining is None or remaining > 0:
+            if remaining is None:
+                chunk = file.read(block_size)
+            else:
+                chunk = file.read(min(block_size, remaining))
+                remaining -= len(chunk)
+            if not chunk:
+                break
+            yield chunk
+
+    def app_iter_range(self, start, stop):
+        """
+        Return a FileIter for the ``start:stop`` range of the file; it
+        can be called once for each of several ranges.
+        """
+        return self.__class__(self.file, self.block_size, start, stop)
+
+    def close(self):
+        self.file.close()
+
+
 class EmptyResponse(object):
     """An empty WSGI response.
 